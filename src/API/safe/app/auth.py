@@ -0,0 +1,187 @@
+# authentication imports
+from fastapi import Request, HTTPException, Depends
+import hashlib
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+import time
+
+# config imports
+from app.config import settings
+from sqlalchemy import select, func
+from app.models import RefreshToken
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, get_db
+from app.cache import AsyncTTLCache
+from app.functions import verify_jwt_token, get_cached_user
+
+logger = logging.getLogger(__name__)
+
+#geverifieerde claims per token digest, vervallen ten laatste bij exp
+claims_cache = AsyncTTLCache(maxsize=settings.JWT_CLAIMS_CACHE_SIZE, ttl=settings.JWT_EXP_MINUTES * 60)
+
+
+class RevocationUnavailable(RuntimeError):
+    """Raised while the revocation set has never been loaded: revoked sessions can't be told apart yet."""
+
+
+class RevocationSet:
+    """In-memory set of revoked session ids (refresh token ids), kept in sync with access.refresh_tokens incrementally."""
+
+    #een transactie die net voor de vorige refresh begon maar pas erna commit, heeft een revoked_at voor de watermark
+    OVERLAP = timedelta(seconds=60)
+    #wachttijd na een mislukte refresh verdubbelt tot dit maximum
+    MAX_BACKOFF_SECONDS = 60
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._revoked = {}  #session id -> expires_at
+        self._watermark = None
+        self._loaded_at = None
+        self._task = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def is_revoked(self, session_id) -> bool:
+        """O(1) check whether a session id was revoked."""
+
+        return session_id in self._revoked
+
+    def add(self, session_id: int):
+        """Mark a session as revoked locally, without waiting for the next refresh."""
+
+        #expires_at is hier niet bekend, de langste levensduur van een refresh token is een veilige bovengrens
+        self._revoked[session_id] = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXP_DAYS)
+
+    async def refresh(self):
+        """Merge the session ids revoked since the previous refresh and drop the expired ones."""
+
+        #verlopen tokens zijn al ongeldig via exp, enkel de lopende revocations zijn nodig
+        query = select(RefreshToken.id, RefreshToken.expires_at).where(RefreshToken.revoked.is_(True), RefreshToken.expires_at > func.now())
+        if self._watermark is not None:
+            query = query.where(RefreshToken.revoked_at > self._watermark - self.OVERLAP)
+        try:
+            async with AsyncSessionLocal() as session:
+                #now() is het begin van de transactie: alles wat daarna ingetrokken wordt, komt bij de volgende refresh
+                watermark = await session.scalar(select(func.now()))
+                rows = (await session.execute(query)).all()
+        except Exception:
+            self._failures += 1
+            backoff = min(self.MAX_BACKOFF_SECONDS, max(1, self.refresh_seconds) * 2 ** (self._failures - 1))
+            self._retry_at = time.monotonic() + backoff
+            logger.exception("Refreshing the token revocation set failed, retrying in %ss", backoff)
+            return
+
+        #samenvoegen in plaats van vervangen, zodat add() tijdens de query niet verloren gaat
+        now = datetime.now(timezone.utc)
+        self._revoked.update((row.id, row.expires_at) for row in rows)
+        for session_id in [session_id for session_id, expires_at in self._revoked.items() if expires_at <= now]:
+            del self._revoked[session_id]
+        self._watermark = watermark
+        self._loaded_at = time.monotonic()
+        self._failures = 0
+
+    async def ensure_fresh(self):
+        """Refresh in the background when stale. Only the very first load is awaited. Raises RevocationUnavailable until one load succeeded."""
+
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.refresh_seconds:
+            return
+        #na een fout niet bij elke request opnieuw de database proberen
+        if now >= self._retry_at and (self._task is None or self._task.done()):
+            self._task = asyncio.ensure_future(self.refresh())
+        if self._loaded_at is None:
+            #fail closed: zonder set kan een ingetrokken sessie niet geweigerd worden
+            if self._task is not None and not self._task.done():
+                await asyncio.shield(self._task)
+            if self._loaded_at is None:
+                raise RevocationUnavailable("Token revocations could not be loaded")
+
+
+revocations = RevocationSet(settings.REVOCATION_REFRESH_SECONDS)
+
+
+def _get_token(request: Request) -> str | None:
+    """Read the access token from the Authorization header or the access_token cookie."""
+
+    header = request.headers.get("authorization")
+    if header and header.lower().startswith("bearer "):
+        return header[7:].strip()
+    return request.cookies.get("access_token")
+
+async def get_current_claims(request: Request) -> dict:
+    """FastAPI dependency returning the verified JWT claims of the caller. Raises 401 when missing, invalid or revoked, 503 while revocations are unavailable."""
+
+    token = _get_token(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    #claims cache op basis van een digest, zodat de token niet telkens gedecodeerd en ge-HMACt wordt
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = claims_cache.get(digest)
+    if payload is None:
+        try:
+            valid, payload = await verify_jwt_token(token)
+        except RuntimeError:
+            raise HTTPException(status_code=500, detail="Token verification failed")
+        if not valid:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        claims_cache.set(digest, payload, ttl=payload["exp"] - time.time())
+    elif payload["exp"] <= time.time():
+        claims_cache.invalidate(digest)
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    #revocation check, tokens zonder sessie kunnen niet ingetrokken worden
+    session_id = payload.get("sid")
+    if session_id is not None:
+        try:
+            await revocations.ensure_fresh()
+        except RevocationUnavailable:
+            raise HTTPException(status_code=503, detail="Authentication temporarily unavailable", headers={"Retry-After": "5"})
+        if revocations.is_revoked(session_id):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+
+    return payload
+
+def require_user(level: int | None = None, request_session: bool = True):
+    """Dependency factory returning the caller's current user (public columns and role) in one cached query.
+
+    The query runs on the request's own session (get_db), so authorization never needs a second pool connection.
+    With `request_session=False` the lookup uses a short-lived session instead, for endpoints that don't need one
+    themselves and would otherwise hold it for the whole response (e.g. a stream).
+    With `level`, the user's current role in the DB must be at most `level`.
+    """
+
+    async def load(payload: dict) -> dict:
+        try:
+            user = await get_cached_user(int(payload["sub"]))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+        except Exception:
+            logger.exception("Loading the current user failed")
+            raise HTTPException(status_code=500, detail="Could not retrieve user")
+
+        if not user:
+            raise HTTPException(status_code=401, detail="User no longer exists")
+        if level is not None and user["role"] > level:
+            raise HTTPException(status_code=403, detail="Insufficient permissions")
+        return user
+
+    if not request_session:
+        #geen get_db: session_scope in get_cached_user opent en sluit dan een eigen session
+        async def dependency(payload: dict = Depends(get_current_claims)) -> dict:
+            return await load(payload)
+        return dependency
+
+    async def dependency(payload: dict = Depends(get_current_claims), db: AsyncSession = Depends(get_db)) -> dict:
+        return await load(payload)
+
+    return dependency
+
+def require_level(level: int, request_session: bool = True):
+    """Dependency factory: the caller must be authenticated and have a role of at most `level` in the DB. Returns the JWT claims."""
+
+    async def dependency(payload: dict = Depends(get_current_claims), user: dict = Depends(require_user(level, request_session))) -> dict:
+        return payload
+
+    return dependency
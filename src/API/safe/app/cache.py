@@ -0,0 +1,116 @@
+from collections import OrderedDict
+import asyncio
+import time
+
+_MISSING = object()
+
+def _retrieve_exception(future):
+    """Mark a load's exception as retrieved, so a failed load without waiters is not logged by asyncio."""
+
+    if not future.cancelled():
+        future.exception()
+
+class AsyncTTLCache:
+    """In-process LRU cache with a TTL per entry and single-flight loading of missing keys."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> lopende load task
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key without loading, or default."""
+
+        entry = self._data.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key, value, ttl: float | None = None):
+        """Store a value, optionally with a shorter TTL than the cache default."""
+
+        self._set(key, value, ttl)
+
+    async def get_or_load(self, key, loader):
+        """Return the cached value for key, or await loader(key) once for all concurrent callers.
+
+        The loader runs in the task of the first caller, so it sees that caller's context (like its DB session).
+        """
+
+        while True:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            #single-flight: gelijktijdige misses wachten op de load van de eerste caller
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                #de eerste caller werd afgebroken, niet wij: zelf opnieuw proberen
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+        return await self._load(key, loader)
+
+    async def _load(self, key, loader):
+        """Run the loader in the current task, share the outcome with waiters and store the value, unless the key was invalidated meanwhile."""
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_retrieve_exception)
+        self._inflight[key] = future
+        self.loads += 1
+        try:
+            value = await loader(key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            if self._inflight.get(key) is future:
+                self._set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _set(self, key, value, ttl: float | None = None):
+        """Store a value and evict the least recently used entries above maxsize."""
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        """Drop a key, including any load that is still running for it."""
+
+        self._data.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def clear(self):
+        """Drop all entries."""
+
+        self._data.clear()
+        self._inflight.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size."""
+
+        return {"hits": self.hits, "misses": self.misses, "loads": self.loads, "size": len(self._data), "maxsize": self.maxsize}
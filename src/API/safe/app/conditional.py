@@ -0,0 +1,63 @@
+from fastapi import Request, Response
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timezone
+import hashlib
+
+#clients moeten altijd revalideren, een 304 kost ons dan bijna niets
+CACHE_CONTROL = "no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag over the given parts, typically ids and updated_at values."""
+
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def last_modified(*timestamps: datetime | None) -> datetime | None:
+    """Latest of the given timestamps in UTC, ignoring None. Naive timestamps are taken as UTC."""
+
+    values = [ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc) for ts in timestamps if ts is not None]
+    return max(values).astimezone(timezone.utc) if values else None
+
+def has_conditions(request: Request) -> bool:
+    """True when the request carries If-None-Match or If-Modified-Since."""
+
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+def is_not_modified(request: Request, etag: str, modified: datetime | None) -> bool:
+    """Evaluate the request's validators. If-None-Match takes precedence over If-Modified-Since (RFC 9110)."""
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        #weak vergelijking, W/ prefix telt niet mee
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    #HTTP dates hebben een resolutie van één seconde
+    return modified.replace(microsecond=0) <= since
+
+def validator_headers(etag: str, modified: datetime | None) -> dict:
+    """ETag, Last-Modified and Cache-Control headers for a response."""
+
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    return headers
+
+def conditional_response(request: Request, response: Response, etag: str, modified: datetime | None) -> Response | None:
+    """Return a 304 response when the client's copy is current. Otherwise set the validators on `response` and return None."""
+
+    headers = validator_headers(etag, modified)
+    if is_not_modified(request, etag, modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from sqlalchemy.orm import declarative_base
-from os import getenv
+from os import getenv, cpu_count
 
 class Settings(BaseSettings):
     DB_HOST: str = getenv("DB_HOST", "localhost")
@@ -11,12 +11,35 @@ class Settings(BaseSettings):
     DB_POOL_SIZE: int = int(getenv("DB_POOL_SIZE", 10))
     DB_MAX_OVERFLOW: int = int(getenv("DB_MAX_OVERFLOW", 20))
     DB_URL: str = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    DB_ECHO_QUERIES: bool = getenv("DB_ECHO_QUERIES", "true").lower() in ("true", "1", "yes")
+    DB_ECHO_QUERIES: bool = getenv("DB_ECHO_QUERIES", "false").lower() in ("true", "1", "yes")  # enkel voor development
+    DB_SLOW_QUERY_MS: float = float(getenv("DB_SLOW_QUERY_MS", 200))  # queries trager dan dit worden gelogd
+    DB_QUERY_SAMPLE_RATE: float = float(getenv("DB_QUERY_SAMPLE_RATE", 0.0))  # fractie van de overige queries die gelogd wordt
+    DB_QUERY_LOG_QUEUE_SIZE: int = int(getenv("DB_QUERY_LOG_QUEUE_SIZE", 10000))
+
+    #Connection pool & prepared statements
+    DB_POOL_MODE: str = getenv("DB_POOL_MODE", "session").lower()  # "session" = eigen pool, "transaction" = achter PgBouncer in transaction pooling
+    DB_POOL_TIMEOUT: float = float(getenv("DB_POOL_TIMEOUT", 10))  # max wachttijd op een vrije connectie, daarna een fout
+    DB_POOL_RECYCLE: int = int(getenv("DB_POOL_RECYCLE", 1800))  # connecties ouder dan dit (seconden) worden vervangen, -1 = nooit
+    DB_POOL_PRE_PING: bool = getenv("DB_POOL_PRE_PING", "false").lower() in ("true", "1", "yes")  # extra round-trip per checkout
+    DB_STATEMENT_CACHE_SIZE: int = int(getenv("DB_STATEMENT_CACHE_SIZE", 256))  # prepared statements per connectie, 0 = uit
+    DB_WARMUP_CONNECTIONS: int = int(getenv("DB_WARMUP_CONNECTIONS", DB_POOL_SIZE))  # connecties die bij het opstarten al geopend worden, max DB_POOL_SIZE
+    READY_MAX_POOL_SATURATION: float = float(getenv("READY_MAX_POOL_SATURATION", 0.9))  # /readyz geeft 503 vanaf deze fractie uitgeleende connecties
+
+    #Read replicas voor GET endpoints, zelfde user/wachtwoord/database als de primary
+    DB_REPLICA_HOSTS: str = getenv("DB_REPLICA_HOSTS", "")  # "host[:port],host[:port]", leeg = alles naar de primary
+    DB_REPLICA_POOL_SIZE: int = int(getenv("DB_REPLICA_POOL_SIZE", DB_POOL_SIZE))
+    DB_REPLICA_MAX_OVERFLOW: int = int(getenv("DB_REPLICA_MAX_OVERFLOW", DB_MAX_OVERFLOW))
+    DB_REPLICA_CHECK_SECONDS: float = float(getenv("DB_REPLICA_CHECK_SECONDS", 5))
+    DB_REPLICA_CHECK_TIMEOUT: float = float(getenv("DB_REPLICA_CHECK_TIMEOUT", 2))
+    DB_REPLICA_MAX_LAG_SECONDS: float = float(getenv("DB_REPLICA_MAX_LAG_SECONDS", 0))  # 0 = replication lag niet controleren
     
     # JWT settings
     JWT_SECRET: str = getenv("JWT_SECRET", "change-this-secret")
     JWT_ALGORITHM: str = getenv("JWT_ALGORITHM", "HS256")
     JWT_EXP_MINUTES: int = int(getenv("JWT_EXP_MINUTES", 15))
+    REFRESH_TOKEN_EXP_DAYS: int = int(getenv("REFRESH_TOKEN_EXP_DAYS", 3))
+    JWT_CLAIMS_CACHE_SIZE: int = int(getenv("JWT_CLAIMS_CACHE_SIZE", 10000))
+    REVOCATION_REFRESH_SECONDS: int = int(getenv("REVOCATION_REFRESH_SECONDS", 10))
 
     #Argon2 Hashing settings
     HASH_TIME_COST: int = int(getenv("HASH_TIME_COST", 3))
@@ -24,6 +47,64 @@ class Settings(BaseSettings):
     HASH_PARALLELISM: int = int(getenv("HASH_PARALLELISM", 4))
     HASH_SALT_LENGTH: int = int(getenv("HASH_SALT_LENGTH", 16))
     HASH_HASH_LENGTH: int = int(getenv("HASH_HASH_LENGTH", 32))
+
+    #Argon2 worker pool settings
+    HASH_EXECUTOR: str = getenv("HASH_EXECUTOR", "thread")  # "thread" of "process"
+    HASH_WORKERS: int = int(getenv("HASH_WORKERS", cpu_count() or 1))
+    HASH_QUEUE_SIZE: int = int(getenv("HASH_QUEUE_SIZE", 64))  # max wachtende jobs bovenop de workers
+
+    #User cache settings
+    USER_CACHE_SIZE: int = int(getenv("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL: int = int(getenv("USER_CACHE_TTL", 30))  # in seconden
+    CACHE_STATS_ACCESS_LEVEL: int = int(getenv("CACHE_STATS_ACCESS_LEVEL", 1))  # maximale role die /cache/stats mag zien
+
+    #Reverse proxies waarvan X-Forwarded-For/-Proto vertrouwd wordt, komma-gescheiden IPs of netwerken ("*" = iedereen)
+    #de limieten per IP houden enkel stand als hier alleen de eigen proxy staat, anders kiest de client zijn IP zelf
+    FORWARDED_ALLOW_IPS: str = getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+    #Rate limit settings, limieten als "aantal/second|minute|hour|day"
+    RATE_LIMIT_ENABLED: bool = getenv("RATE_LIMIT_ENABLED", "true").lower() in ("true", "1", "yes")
+    RATE_LIMIT_BACKEND: str = getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" of "postgres"
+    RATE_LIMIT_DEFAULT: str = getenv("RATE_LIMIT_DEFAULT", "300/minute")  # per client IP, alle requests
+    RATE_LIMIT_LOGIN_IP: str = getenv("RATE_LIMIT_LOGIN_IP", "20/minute")
+    RATE_LIMIT_LOGIN_USER: str = getenv("RATE_LIMIT_LOGIN_USER", "5/minute")
+    RATE_LIMIT_RESET_IP: str = getenv("RATE_LIMIT_RESET_IP", "10/hour")
+    RATE_LIMIT_RESET_EMAIL: str = getenv("RATE_LIMIT_RESET_EMAIL", "3/hour")
+
+    #Reaper settings, opkuis van verlopen tokens en password resets
+    REAPER_INTERVAL_SECONDS: int = int(getenv("REAPER_INTERVAL_SECONDS", 300))  # 0 = uitgeschakeld
+    REAPER_BATCH_SIZE: int = int(getenv("REAPER_BATCH_SIZE", 1000))
+
+    #Export settings
+    EXPORT_BATCH_SIZE: int = int(getenv("EXPORT_BATCH_SIZE", 1000))
+    EXPORT_ACCESS_LEVEL: int = int(getenv("EXPORT_ACCESS_LEVEL", 1))  # maximale role die mag exporteren
+
+    #Bulk user import settings
+    IMPORT_MAX_ROWS: int = int(getenv("IMPORT_MAX_ROWS", 10000))
+    IMPORT_MAX_BYTES: int = int(getenv("IMPORT_MAX_BYTES", 4 * 1024 * 1024))  # grotere bodies worden geweigerd voor het parsen
+    IMPORT_HASH_CHUNK_SIZE: int = int(getenv("IMPORT_HASH_CHUNK_SIZE", 8))  # wachtwoorden per job in de hashing pool
+    IMPORT_ACCESS_LEVEL: int = int(getenv("IMPORT_ACCESS_LEVEL", 1))  # maximale role die mag importeren
+
+    #Password reset settings
+    PASSWORD_RESET_EXP_MINUTES: int = int(getenv("PASSWORD_RESET_EXP_MINUTES", 60))
+    PASSWORD_RESET_URL: str = getenv("PASSWORD_RESET_URL", "http://localhost:3000/reset-password?token={token}")  # {token} wordt ingevuld
+
+    #Mail outbox settings
+    MAIL_BACKEND: str = getenv("MAIL_BACKEND", "smtp")  # "smtp" of "file"
+    MAIL_DEV_MODE: bool = getenv("MAIL_DEV_MODE", "false").lower() in ("true", "1", "yes")  # vereist voor "file", reset tokens komen dan leesbaar op schijf
+    MAIL_FROM: str = getenv("MAIL_FROM", "no-reply@localhost")
+    MAIL_FILE_PATH: str = getenv("MAIL_FILE_PATH", "mail_outbox.jsonl")  # één JSON lijn per verstuurde mail
+    MAIL_SMTP_HOST: str = getenv("MAIL_SMTP_HOST", "localhost")
+    MAIL_SMTP_PORT: int = int(getenv("MAIL_SMTP_PORT", 1025))  # 1025 = lokale SMTP stand-in zoals Mailpit
+    MAIL_SMTP_USER: str = getenv("MAIL_SMTP_USER", "")
+    MAIL_SMTP_PASSWORD: str = getenv("MAIL_SMTP_PASSWORD", "")
+    MAIL_SMTP_STARTTLS: bool = getenv("MAIL_SMTP_STARTTLS", "false").lower() in ("true", "1", "yes")
+    MAIL_SMTP_TIMEOUT: float = float(getenv("MAIL_SMTP_TIMEOUT", 10))
+    OUTBOX_POLL_SECONDS: float = float(getenv("OUTBOX_POLL_SECONDS", 5))  # 0 = geen worker in dit proces
+    OUTBOX_BATCH_SIZE: int = int(getenv("OUTBOX_BATCH_SIZE", 50))
+    OUTBOX_MAX_ATTEMPTS: int = int(getenv("OUTBOX_MAX_ATTEMPTS", 5))
+    OUTBOX_RETRY_SECONDS: int = int(getenv("OUTBOX_RETRY_SECONDS", 30))  # verdubbelt bij elke mislukte poging
+    OUTBOX_RETENTION_HOURS: int = int(getenv("OUTBOX_RETENTION_HOURS", 24))  # verstuurde en opgegeven berichten daarna verwijderen
     
 settings = Settings()
 # gebruik settings.DB_HOST etc.
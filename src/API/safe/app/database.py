@@ -1,7 +1,17 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, OperationalError, InterfaceError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from sqlalchemy import event, text
+from starlette.exceptions import HTTPException
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from app.config import settings
+from app.metrics import record_query, db_pool_wait, db_read_sessions
+from app.querylog import log_query
+from uuid import uuid4
+import asyncio
 import logging
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -9,17 +19,190 @@ logger = logging.getLogger(__name__)
 DATABASE_URL = settings.DB_URL
 engine = None
 AsyncSessionLocal = None
+replicas = None
 
-#Async engine aanmaken met foutafhandeling
-try:
-    engine = create_async_engine(
-        DATABASE_URL,
+#sessie van de lopende request, gezet door get_db, zodat helpers dezelfde connectie gebruiken
+current_session: ContextVar[AsyncSession | None] = ContextVar("current_session", default=None)
+
+#"session": eigen connection pool, "transaction": PgBouncer in transaction pooling beheert de connecties
+POOL_MODES = ("session", "transaction")
+
+class TimedCheckout:
+    """Pool mixin that records how long a checkout waits for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait.observe(time.perf_counter() - start)
+
+class TimedQueuePool(TimedCheckout, AsyncAdaptedQueuePool):
+    """Queue pool that records how long a checkout waits for a connection."""
+
+class TimedNullPool(TimedCheckout, NullPool):
+    """Pool that opens a new connection per checkout (for PgBouncer) and records the connect time as checkout wait."""
+
+    _checked_out = 0
+
+    def _do_get(self):
+        record = super()._do_get()
+        self._checked_out += 1
+        return record
+
+    def _do_return_conn(self, record):
+        self._checked_out -= 1
+        super()._do_return_conn(record)
+
+    def checkedout(self) -> int:
+        """Open connections, for the db_pool_checked_out gauge."""
+
+        return self._checked_out
+
+    def size(self) -> int:
+        return 0
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    record_query(duration)
+    log_query(statement, duration, cursor.rowcount)
+
+def _prepared_statement_name() -> str:
+    """Unique name for a prepared statement. Behind PgBouncer the next transaction can land on a server connection that already has asyncpg's sequential names."""
+
+    return f"__asyncpg_{uuid4()}__"
+
+def engine_options(pool_size: int, max_overflow: int, pool_mode: str | None = None, statement_cache_size: int | None = None, pre_ping: bool | None = None) -> dict:
+    """Pool and asyncpg arguments for create_async_engine. Arguments left at None come from the settings."""
+
+    pool_mode = pool_mode or settings.DB_POOL_MODE
+    statement_cache_size = settings.DB_STATEMENT_CACHE_SIZE if statement_cache_size is None else statement_cache_size
+    pre_ping = settings.DB_POOL_PRE_PING if pre_ping is None else pre_ping
+    if pool_mode not in POOL_MODES:
+        raise ValueError(f"DB_POOL_MODE must be one of {', '.join(POOL_MODES)}, not {pool_mode!r}")
+
+    if pool_mode == "transaction":
+        #PgBouncer deelt server connecties per transactie: geen eigen pool en geen prepared statements die een transactie overleven
+        return {
+            "poolclass": TimedNullPool,
+            "connect_args": {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": _prepared_statement_name,
+            },
+        }
+
+    #statement_cache_size is de cache van asyncpg zelf, prepared_statement_cache_size die van SQLAlchemy per connectie
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,  #recycle i.p.v. een ping bij elke checkout tegen connecties die de server of een firewall gesloten heeft
+        "pool_pre_ping": pre_ping,
+        "connect_args": {
+            "statement_cache_size": statement_cache_size,
+            "prepared_statement_cache_size": statement_cache_size,
+        },
+    }
+
+def _create_engine(url: str, pool_size: int, max_overflow: int, **options):
+    """Create an async engine with the timed pool and the query hooks for /metrics. Extra options go to engine_options."""
+
+    new_engine = create_async_engine(
+        url,
         echo=settings.DB_ECHO_QUERIES,  #echo = SQL queries loggen
-        pool_pre_ping=True,
-        pool_size=settings.DB_POOL_SIZE,
-        max_overflow=settings.DB_MAX_OVERFLOW
+        **engine_options(pool_size, max_overflow, **options)
     )
 
+    #query hooks voor de /metrics endpoint
+    event.listen(new_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(new_engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    return new_engine
+
+def _replica_url(host: str) -> str:
+    """DB URL for a replica given as "host[:port]", with the credentials and database of the primary."""
+
+    host, _, port = host.strip().partition(":")
+    return f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASS}@{host}:{port or settings.DB_PORT}/{settings.DB_NAME}"
+
+
+class ReplicaSet:
+    """Read replica engines with a health flag each. Hands out healthy replicas round robin, or the primary when none is healthy."""
+
+    def __init__(self, primary, hosts: list[str]):
+        self.primary = primary
+        self.hosts = hosts
+        self.engines = [_create_engine(_replica_url(host), settings.DB_REPLICA_POOL_SIZE, settings.DB_REPLICA_MAX_OVERFLOW) for host in hosts]
+        self.healthy = [False] * len(self.engines)  # pas gezond na de eerste check
+        self._next = 0
+
+    def pick(self):
+        """Engine for the next read: a healthy replica, otherwise the primary."""
+
+        healthy = [e for e, ok in zip(self.engines, self.healthy) if ok]
+        if not healthy:
+            return self.primary
+        self._next = (self._next + 1) % len(healthy)
+        return healthy[self._next]
+
+    def healthy_count(self) -> int:
+        """Number of replicas currently in rotation."""
+
+        return sum(self.healthy)
+
+    def mark_down(self, target):
+        """Take a replica out of rotation until the next successful health check."""
+
+        for index, replica in enumerate(self.engines):
+            if replica is target and self.healthy[index]:
+                self.healthy[index] = False
+                logger.warning("Read replica %s marked down, reads fall back to other replicas or the primary", self.hosts[index])
+
+    async def _check(self, replica) -> bool:
+        """A replica is healthy when it answers, and (with DB_REPLICA_MAX_LAG_SECONDS) when its replay lag is small enough."""
+
+        async with replica.connect() as conn:
+            row = (await conn.execute(text(
+                "SELECT pg_is_in_recovery(), EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+            ))).first()
+        in_recovery, lag = row
+        #bij weinig writes groeit de lag ook op een gezonde replica, daarom standaard uit
+        if settings.DB_REPLICA_MAX_LAG_SECONDS > 0 and in_recovery and lag is not None and lag > settings.DB_REPLICA_MAX_LAG_SECONDS:
+            return False
+        return True
+
+    async def check_all(self):
+        """Run one health check on every replica and update the health flags."""
+
+        for index, replica in enumerate(self.engines):
+            try:
+                ok = await asyncio.wait_for(self._check(replica), settings.DB_REPLICA_CHECK_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug("Health check of read replica %s failed: %s", self.hosts[index], e)
+                ok = False
+            if ok != self.healthy[index]:
+                logger.warning("Read replica %s is now %s", self.hosts[index], "healthy" if ok else "unhealthy")
+            self.healthy[index] = ok
+
+    async def run(self, interval: float):
+        """Background loop re-checking the replicas every `interval` seconds."""
+
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_all()
+
+
+#Async engine aanmaken met foutafhandeling
+try:
+    engine = _create_engine(DATABASE_URL, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
+    replicas = ReplicaSet(engine, [host for host in settings.DB_REPLICA_HOSTS.split(",") if host.strip()])
+
     #Async session factory
     AsyncSessionLocal = async_sessionmaker(
         engine,
@@ -29,26 +212,38 @@ try:
         autoflush=False
     )
 
-    logger.info("Async DB engine and sessionmaker created for %s", DATABASE_URL)
+    logger.info("Async DB engine and sessionmaker created for %s (pool mode %s)", DATABASE_URL, settings.DB_POOL_MODE)
+    if replicas.engines:
+        logger.info("Read replicas configured: %s", ", ".join(replicas.hosts))
 except SQLAlchemyError as e:
     logger.exception("SQLAlchemy error while creating async engine/sessionmaker: %s", e)
 except Exception as e:
     logger.exception("Unexpected error while configuring database: %s", e)
 
 
-#Async dependency voor FastAPI
-async def get_db():
+@asynccontextmanager
+async def _request_session(bind=None):
+    """Session for one request, published in current_session, with rollback and logging on errors."""
+
     if AsyncSessionLocal is None:
         logger.error("AsyncSessionLocal is not configured; cannot provide DB session.")
         raise RuntimeError("Database session factory is not available")
 
-    async with AsyncSessionLocal() as session:
-
+    async with (AsyncSessionLocal(bind=bind) if bind is not None else AsyncSessionLocal()) as session:
+        token = current_session.set(session)
         try:
             yield session
+        except HTTPException:
+            #verwachte fout (404, 409, ...), enkel de transactie terugdraaien
+            await session.rollback()
+            raise
         except Exception as e:
             logger.exception("Unhandled exception during DB session usage: %s", e)
 
+            #connectie naar een replica kapot: uit de rotatie tot de volgende health check
+            if bind is not None and isinstance(e, (OperationalError, InterfaceError, OSError)):
+                replicas.mark_down(bind)
+
             try:
                 await session.rollback()
                 logger.debug("DB session rollback succeeded after exception.")
@@ -57,7 +252,92 @@ async def get_db():
             raise
 
         finally:
+            try:
+                current_session.reset(token)
+            except ValueError:
+                current_session.set(None) #exit in een andere context dan de setup
             try:
                 await session.close()
             except Exception:
-                logger.exception("Failed to close DB session cleanly.")
\ No newline at end of file
+                logger.exception("Failed to close DB session cleanly.")
+
+async def warm_pool(target, count: int, statements=()) -> int:
+    """Open up to `count` pool connections concurrently and run `statements` on each, so the first requests find open connections with prepared statements. Returns the number of connections opened."""
+
+    #zonder eigen pool (transaction mode) één connectie: test de database en vult de compiled cache van SQLAlchemy
+    count = 1 if isinstance(target.pool, NullPool) else min(count, target.pool.size())
+    if count <= 0:
+        return 0
+
+    #alle connecties tegelijk vasthouden, anders geeft de pool steeds dezelfde terug
+    opened = await asyncio.gather(*(target.connect().start() for _ in range(count)), return_exceptions=True)
+    connections = [conn for conn in opened if not isinstance(conn, BaseException)]
+    failures = [conn for conn in opened if isinstance(conn, BaseException)]
+    if failures:
+        logger.warning("Pool warm-up opened %d of %d connections: %s", len(connections), count, failures[0])
+
+    async def prime(conn):
+        try:
+            for statement in statements:
+                await conn.execute(statement)
+            await conn.rollback()
+        finally:
+            await conn.close()
+
+    await asyncio.gather(*(prime(conn) for conn in connections))
+    return len(connections)
+
+def pool_stats() -> dict:
+    """Checked-out connections, size and saturation of the primary pool. A value is None when it doesn't apply: no engine, or no own pool (transaction mode)."""
+
+    pool = engine.pool if engine is not None else None
+    checked_out = pool.checkedout() if hasattr(pool, "checkedout") else None
+    if pool is None or isinstance(pool, NullPool):
+        return {"checked_out": checked_out, "size": None, "saturation": None}
+
+    capacity = pool.size() + settings.DB_MAX_OVERFLOW
+    return {"checked_out": checked_out, "size": pool.size(), "saturation": checked_out / capacity if capacity > 0 else None}
+
+def pool_saturation() -> float | None:
+    """Fraction of the primary pool's connections (including overflow) that is checked out. None without a pool (transaction mode)."""
+
+    return pool_stats()["saturation"]
+
+#Async dependency voor FastAPI, op de primary: voor writes en read-after-write
+async def get_db():
+    async with _request_session() as session:
+        yield session
+
+def _read_bind():
+    """Engine for a read-only session, counted per target."""
+
+    bind = replicas.pick() if replicas is not None else engine
+    db_read_sessions.inc("primary" if bind is engine else "replica")
+    return bind
+
+#Async dependency voor read-only GET handlers, op een gezonde replica of anders de primary
+async def get_read_db():
+    bind = _read_bind()
+    async with _request_session(bind if bind is not engine else None) as session:
+        yield session
+
+def ReadSessionLocal() -> AsyncSession:
+    """New session on a healthy read replica (or the primary), for reads outside a request like streaming exports."""
+
+    return AsyncSessionLocal(bind=_read_bind())
+
+@asynccontextmanager
+async def session_scope(primary: bool = False):
+    """Yield the session of the current request when there is one, otherwise a new short-lived session.
+
+    Use this for reads in helpers, so an authorized request holds one pool connection instead of two.
+    With `primary`, a request session on a read replica is not reused (for example for cache loads that must see the latest writes).
+    Writes that run after the response (background tasks) must open their own session.
+    """
+
+    session = current_session.get()
+    if session is not None and (not primary or session.bind is engine):
+        yield session
+        return
+    async with AsyncSessionLocal() as session:
+        yield session
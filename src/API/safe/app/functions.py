@@ -4,43 +4,188 @@ from argon2.exceptions import VerifyMismatchError, Argon2Error
 import jwt
 
 # algemene imports
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from ipaddress import ip_address
+import hashlib
+import secrets
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+import logging
+import json
+import base64
 
 # config imports
 from app.config import settings
-from sqlalchemy import select
-from app.models import User
-from app.database import AsyncSessionLocal
+from sqlalchemy import select, update, func
+from app.models import User, RefreshToken, PasswordReset, USER_PUBLIC_COLUMNS
+from app.database import AsyncSessionLocal, ReadSessionLocal, session_scope
+from app.cache import AsyncTTLCache
+from app.metrics import argon2_time
+import time
+
+logger = logging.getLogger(__name__)
+
+#gedeelde Argon2 hasher met de parameters uit de settings
+password_hasher = PasswordHasher(
+    time_cost=settings.HASH_TIME_COST,
+    memory_cost=settings.HASH_MEMORY_COST,
+    parallelism=settings.HASH_PARALLELISM,
+    salt_len=settings.HASH_SALT_LENGTH,
+    hash_len=settings.HASH_HASH_LENGTH,
+)
+
+#Argon2 worker pool, zodat hashing de event loop niet blokkeert
+_hash_executor = None
+_hash_pending = 0
+
+class HashingBusyError(RuntimeError):
+    """Raised when the hashing worker pool and its queue are full."""
+
+def _get_hash_executor():
+    """Return the shared hashing executor, creating it on first use."""
+
+    global _hash_executor
+    if _hash_executor is None:
+        workers = max(1, settings.HASH_WORKERS)
+        if settings.HASH_EXECUTOR.lower() == "process":
+            _hash_executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            _hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+    return _hash_executor
+
+def hash_pool_pending() -> int:
+    """Number of hash/verify jobs running or waiting in the hashing pool."""
+
+    return _hash_pending
+
+def shutdown_hash_executor():
+    """Shut down the hashing executor. Called on application shutdown."""
+
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+async def _run_in_hash_pool(operation: str, func, *args):
+    """Run func in the hashing executor, timed under `operation`. Raises HashingBusyError when the queue is full."""
+
+    global _hash_pending
+    if _hash_pending >= max(1, settings.HASH_WORKERS) + settings.HASH_QUEUE_SIZE:
+        raise HashingBusyError("Hashing queue is full")
+
+    _hash_pending += 1
+    start = time.perf_counter()
+
+    def release(_=None):
+        global _hash_pending
+        _hash_pending -= 1
+        argon2_time.observe(time.perf_counter() - start, operation)
+
+    loop = asyncio.get_running_loop()
+    job = _get_hash_executor().submit(func, *args)
+    try:
+        return await asyncio.wrap_future(job)
+    finally:
+        #bij een cancel wordt een wachtende job geschrapt, een lopende job bezet zijn worker tot hij klaar is en telt tot dan mee
+        if job.done():
+            release()
+        else:
+            job.add_done_callback(lambda _: loop.call_soon_threadsafe(release))
+
+async def warm_hash_pool() -> int:
+    """Start every hashing worker with one throwaway hash, so the first logins don't pay for starting workers and allocating Argon2 memory. Returns the number of workers."""
+
+    workers = max(1, settings.HASH_WORKERS)
+    await asyncio.gather(*(_run_in_hash_pool("warmup", _hash_password_sync, "warmup") for _ in range(workers)))
+    return workers
+
+def _hash_password_sync(password: str) -> str:
+    """Blocking Argon2 hash, runs inside the hashing executor."""
+
+    return password_hasher.hash(password)
+
+def _verify_password_sync(stored_hash: str, password: str) -> bool:
+    """Blocking Argon2 verify, runs inside the hashing executor."""
+
+    return password_hasher.verify(stored_hash, password)
 
 async def create_password_hash(password: str) -> str:
     """Create a hashed password using Argon2id. Expects a plain password string. Returns the hashed password string."""
-    
-    ph = PasswordHasher(
-        time_cost=settings.HASH_TIME_COST,
-        memory_cost=settings.HASH_MEMORY_COST,
-        parallelism=settings.HASH_PARALLELISM,
-        salt_len=settings.HASH_SALT_LENGTH,
-        hash_len=settings.HASH_HASH_LENGTH,
-    )
+
+    try:
+        return await _run_in_hash_pool("hash", _hash_password_sync, password)
+    except Argon2Error as e:
+        raise RuntimeError("Password hashing failed") from e
+
+def _hash_passwords_sync(passwords: list[str]) -> list[str]:
+    """Blocking Argon2 hash of a chunk of passwords, runs inside the hashing executor."""
+
+    return [password_hasher.hash(password) for password in passwords]
+
+async def hash_passwords(passwords: list[str], chunk_size: int) -> list[str]:
+    """Hash many passwords in parallel over the hashing workers, `chunk_size` per job. Returns the hashes in input order."""
+
+    #hoogstens één chunk per worker tegelijk, zodat logins tussen de chunks door kunnen
+    semaphore = asyncio.Semaphore(max(1, settings.HASH_WORKERS))
+    async def hash_chunk(chunk: list[str]) -> list[str]:
+        async with semaphore:
+            return await _run_in_hash_pool("hash_bulk", _hash_passwords_sync, chunk)
+
+    size = max(1, chunk_size)
+    chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    tasks = [asyncio.ensure_future(hash_chunk(chunk)) for chunk in chunks]
     try:
-        return ph.hash(password)
+        results = await asyncio.gather(*tasks)
     except Argon2Error as e:
         raise RuntimeError("Password hashing failed") from e
+    finally:
+        #één chunk faalt (bv. HashingBusyError): de rest is zinloos, wachtende chunks niet meer starten
+        for task in tasks:
+            task.cancel()
+    return [password_hash for chunk in results for password_hash in chunk]
 
 async def verify_password(stored_hash: str, password: str) -> bool:
     """Verify a plain password against a stored Argon2 hash. Expects stored_hash and password. Returns boolean."""
 
-    ph = PasswordHasher()
     try:
-        ph.verify(stored_hash, password)
+        await _run_in_hash_pool("verify", _verify_password_sync, stored_hash, password)
         return True
     except VerifyMismatchError:
         return False
     except Argon2Error as e:
         raise RuntimeError("Password verification failed") from e
+
+def password_needs_rehash(stored_hash: str) -> bool:
+    """Check whether a stored hash was made with other parameters than the current settings."""
+
+    try:
+        return password_hasher.check_needs_rehash(stored_hash)
+    except Exception:
+        return False
+
+async def rehash_user_password(user_id: int, old_hash: str, password: str):
+    """Upgrade a user's password hash to the current parameters. Meant to run as a background task after login."""
+
+    try:
+        new_hash = await create_password_hash(password)
+    except RuntimeError:
+        #pool vol of hashing mislukt, volgende login opnieuw proberen
+        logger.warning("Skipping password rehash for user %s", user_id)
+        return
+
+    #enkel updaten als de hash ondertussen niet veranderd is
+    query = update(User).where(User.id == user_id, User.password_hash == old_hash).values(password_hash=new_hash)
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(query)
+            await session.commit()
+    except Exception:
+        logger.exception("Password rehash for user %s failed", user_id)
+        return
+    invalidate_user(user_id)
     
-async def create_jwt_token(user_id: int, username: str, role: int):
-    """Create a JWT token and return (token, expiration_datetime). Expects user_id, username, role."""
+async def create_jwt_token(user_id: int, username: str, role: int, session_id: int | None = None):
+    """Create a JWT token and return (token, expiration_datetime). Expects user_id, username, role and optionally the refresh token id as session_id."""
 
     now = datetime.utcnow()
     exp = now + timedelta(minutes=settings.JWT_EXP_MINUTES)
@@ -51,6 +196,8 @@ async def create_jwt_token(user_id: int, username: str, role: int):
         "iat": int(now.timestamp()),
         "exp": int(exp.timestamp()),
     }
+    if session_id is not None:
+        payload["sid"] = session_id #koppelt de token aan een refresh token, voor revocation
 
     try:
         token = jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
@@ -63,7 +210,7 @@ async def verify_jwt_token(token: str):
     """Verify a JWT token and return (is_valid: bool, payload: dict|None)."""
     
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM], options={"require": ["exp", "sub"]})
         return True, payload
     except jwt.ExpiredSignatureError:
         return False, None
@@ -72,6 +219,62 @@ async def verify_jwt_token(token: str):
     except Exception as e:
         raise RuntimeError("Token verification failed") from e
 
+#token_type van een refresh token dat al ingeruild werd, hergebruik ervan = diefstal
+ROTATED_TOKEN_TYPE = "rotated"
+
+def hash_refresh_token(raw_token: str) -> str:
+    """Hash a refresh token for storage. SHA-256 is enough since the token itself is random."""
+
+    return hashlib.sha256(raw_token.encode()).hexdigest()
+
+def parse_client_ip(host: str | None):
+    """Return host as an IP address object, or None if it is not a valid IP."""
+
+    try:
+        return ip_address(host) if host else None
+    except ValueError:
+        return None
+
+async def create_refresh_token(db, user_id: int, ip=None, user_agent: str | None = None):
+    """Store a new refresh token for a user. Returns (raw_token, RefreshToken). The caller commits."""
+
+    raw_token = secrets.token_urlsafe(32)
+    refresh_token = RefreshToken(
+        user_id=user_id,
+        token=hash_refresh_token(raw_token), #enkel de hash wordt opgeslagen
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXP_DAYS),
+        ip=ip,
+        user_agent=user_agent,
+    )
+    db.add(refresh_token)
+    await db.flush() #id ophalen voor de sid claim
+    return raw_token, refresh_token
+
+def create_password_reset(db, user_id: int, ip=None, user_agent: str | None = None) -> str:
+    """Store a new password reset for a user. Returns the raw token for the reset link. The caller commits."""
+
+    raw_token = secrets.token_urlsafe(32)
+    db.add(PasswordReset(
+        user_id=user_id,
+        reset_token=hash_refresh_token(raw_token), #zelfde SHA-256 als refresh tokens, enkel de hash wordt opgeslagen
+        expires_at=datetime.now(timezone.utc) + timedelta(minutes=settings.PASSWORD_RESET_EXP_MINUTES),
+        ip=ip,
+        user_agent=user_agent,
+    ))
+    return raw_token
+
+async def revoke_user_sessions(db, user_id: int) -> list[int]:
+    """Revoke all active refresh tokens of a user. Returns the revoked ids. The caller commits."""
+
+    query = (
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked.is_(False))
+        .values(revoked=True, revoked_at=func.now())
+        .returning(RefreshToken.id)
+    )
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
 async def has_level_access_by_jwt(payload: dict, level: int) -> bool:
     """Check whether the given JWT payload grants user access."""
 
@@ -89,34 +292,87 @@ async def has_level_access_by_jwt(payload: dict, level: int) -> bool:
     return role_int <= level
 
 
-async def has_level_access_by_db(payload: dict, level: int) -> bool:
-    """Check whether the user identified in `payload` has access by querying the DB."""
+#gedeelde user cache, per worker process
+user_cache = AsyncTTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
 
-    if not isinstance(payload, dict) or level is None:
-        return False
+def user_by_id_query(user_id: int):
+    """Query for the public columns of one user."""
 
-    sub = payload.get("sub")
-    if sub is None:
-        return False
-    try:
-        user_id = int(sub)
-    except (TypeError, ValueError):
-        return False
+    return select(*USER_PUBLIC_COLUMNS).where(User.id == user_id)
+
+async def _load_user(user_id: int):
+    """Load the public columns of a user from the DB. Returns a dict or None."""
 
-    query = select(User).where(User.id == user_id)
+    query = user_by_id_query(user_id)
+    #altijd de primary: na invalidate_user mag een achterlopende replica de cache niet opnieuw vullen
+    async with session_scope(primary=True) as session:
+        result = await session.execute(query)
+        row = result.mappings().first()
+    return dict(row) if row else None
+
+async def get_cached_user(user_id: int):
+    """Return the public data of a user (dict or None), using the user cache."""
+
+    return await user_cache.get_or_load(user_id, _load_user)
+
+def invalidate_user(user_id: int):
+    """Drop a user from the cache. Call after every write to that user."""
+
+    user_cache.invalidate(user_id)
+
+async def record_login(user_id: int):
+    """Set last_login_at for a user. Meant to run as a background task after login."""
+
+    query = update(User).where(User.id == user_id).values(last_login_at=datetime.utcnow())
     try:
         async with AsyncSessionLocal() as session:
-            result = await session.execute(query)
-            user = result.scalars().first()
+            await session.execute(query)
+            await session.commit()
     except Exception:
-        return False
+        logger.exception("Updating last_login_at for user %s failed", user_id)
+        return
+    invalidate_user(user_id)
 
-    if not user:
-        return False
+def violated_constraint(error) -> str | None:
+    """Name of the constraint behind a SQLAlchemy IntegrityError raised by asyncpg, None when unknown."""
 
-    try:
-        role_int = int(user.role)
-    except (TypeError, ValueError):
-        return False
+    #error.orig is de DBAPI adapter van SQLAlchemy, de asyncpg exceptie zelf hangt daar als __cause__ onder
+    return getattr(getattr(error.orig, "__cause__", None), "constraint_name", None)
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode a (created_at, id) keyset position as an opaque cursor string."""
+
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Decode a cursor made by encode_cursor. Raises ValueError for invalid cursors."""
+
+    created_at, _, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rpartition("|")
+    return datetime.fromisoformat(created_at), int(row_id)
+
+def encode_rank_cursor(rank: float, row_id: int) -> str:
+    """Encode a (rank, id) keyset position for ranked search results."""
+
+    return base64.urlsafe_b64encode(f"{rank!r}|{row_id}".encode()).decode()
+
+def decode_rank_cursor(cursor: str) -> tuple[float, int]:
+    """Decode a cursor made by encode_rank_cursor. Raises ValueError for invalid cursors."""
+
+    rank, _, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rpartition("|")
+    return float(rank), int(row_id)
+
+def _json_default(value):
+    """Fallback JSON encoder for values like datetimes and IP addresses."""
+
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+async def stream_ndjson(columns, batch_size: int):
+    """Stream the given columns as NDJSON chunks of batch_size rows, using a server-side cursor."""
 
-    return role_int <= level
\ No newline at end of file
+    query = select(*columns).order_by(columns[0]).execution_options(yield_per=batch_size)
+    async with ReadSessionLocal() as session:
+        result = await session.stream(query)
+        async for partition in result.mappings().partitions():
+            yield "".join(json.dumps(dict(row), default=_json_default) + "\n" for row in partition)
@@ -0,0 +1,100 @@
+from email.message import EmailMessage
+from datetime import datetime, timezone
+from typing import Callable, Protocol
+from app.config import settings
+import smtplib
+import json
+
+#senders blokkeren (bestand, SMTP socket), de outbox worker roept ze aan via een thread
+
+
+class MailSender(Protocol):
+    """Delivers a batch of mails. Returns one entry per message: None when sent, otherwise the exception."""
+
+    def send_batch(self, messages: list[EmailMessage]) -> list[Exception | None]: ...
+
+
+class FileSender:
+    """Development sink that appends every mail as one JSON line to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def send_batch(self, messages: list[EmailMessage]) -> list[Exception | None]:
+        lines = [json.dumps({
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+            "from": message["From"],
+            "to": message["To"],
+            "subject": message["Subject"],
+            "body": message.get_content(),
+        }) for message in messages]
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return [None] * len(messages)
+
+
+class SmtpSender:
+    """Sends mails over one SMTP connection per batch, e.g. to a local stand-in like Mailpit or to a relay."""
+
+    def __init__(self, host: str, port: int, username: str = "", password: str = "", starttls: bool = False, timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send_batch(self, messages: list[EmailMessage]) -> list[Exception | None]:
+        #een fout bij het verbinden gaat naar de caller, die markeert dan de hele batch als mislukt
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+
+            results = []
+            for index, message in enumerate(messages):
+                try:
+                    smtp.send_message(message)
+                    results.append(None)
+                except smtplib.SMTPServerDisconnected as e:
+                    #verbinding weg: wat al verstuurd is blijft verstuurd, de rest volgt bij een volgende poging
+                    return results + [e] * (len(messages) - index)
+                except smtplib.SMTPException as e:
+                    results.append(e)
+            return results
+
+
+#MAIL_BACKEND -> factory, andere transports kunnen zich hier registreren
+SENDERS: dict[str, Callable[[], MailSender]] = {
+    "file": lambda: FileSender(settings.MAIL_FILE_PATH),
+    "smtp": lambda: SmtpSender(
+        settings.MAIL_SMTP_HOST,
+        settings.MAIL_SMTP_PORT,
+        settings.MAIL_SMTP_USER,
+        settings.MAIL_SMTP_PASSWORD,
+        settings.MAIL_SMTP_STARTTLS,
+        settings.MAIL_SMTP_TIMEOUT,
+    ),
+}
+
+def get_sender() -> MailSender:
+    """Sender for the configured MAIL_BACKEND."""
+
+    backend = settings.MAIL_BACKEND.lower()
+    if backend not in SENDERS:
+        raise ValueError(f"MAIL_BACKEND must be one of {', '.join(SENDERS)}, not {settings.MAIL_BACKEND!r}")
+    #de file sender schrijft reset links in plain text weg, nooit per ongeluk in productie
+    if backend == "file" and not settings.MAIL_DEV_MODE:
+        raise ValueError("MAIL_BACKEND=file is only allowed with MAIL_DEV_MODE=true")
+    return SENDERS[backend]()
+
+def build_message(recipient: str, subject: str, body: str) -> EmailMessage:
+    """Plain text mail from MAIL_FROM."""
+
+    message = EmailMessage()
+    message["From"] = settings.MAIL_FROM
+    message["To"] = recipient
+    message["Subject"] = subject
+    message.set_content(body)
+    return message
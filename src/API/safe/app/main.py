@@ -1,29 +1,145 @@
 # -------- IMPORTS --------
 #api imports
 from app.config import description, settings
-from fastapi import FastAPI, Depends, Request, HTTPException, Response
-from datetime import datetime, timedelta
+from fastapi import FastAPI, Depends, Request, HTTPException, Response, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
+from starlette.formparsers import MultiPartParser, MultiPartException
+from typing import Literal
+from datetime import datetime, timezone
+import html
+import json
+import csv
+import io
 
 #database & ORM imports
-from app.database import get_db
-from app.database import AsyncSessionLocal
+from app.database import get_db, get_read_db
+from app.database import AsyncSessionLocal, engine, replicas, warm_pool, pool_saturation, pool_stats
 import app.models as models
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
+from sqlalchemy import select, update, or_, func, tuple_, case, bindparam, any_, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert, ARRAY
 from sqlalchemy.exc import IntegrityError
 
 #pydantic imports
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, ValidationError
 
 #logging & authentication imports
-from app.functions import create_password_hash, verify_password, create_jwt_token
+from app.functions import create_password_hash, verify_password, create_jwt_token, HashingBusyError, shutdown_hash_executor, hash_pool_pending
+from app.functions import password_needs_rehash, rehash_user_password, hash_passwords
+from app.functions import stream_ndjson, encode_cursor, decode_cursor, encode_rank_cursor, decode_rank_cursor, violated_constraint
+from app.auth import require_level, revocations, get_current_claims
+from app.functions import create_refresh_token, hash_refresh_token, revoke_user_sessions, parse_client_ip, ROTATED_TOKEN_TYPE
+from app.functions import create_password_reset
+from app.functions import get_cached_user, invalidate_user, record_login, user_cache, user_by_id_query, warm_hash_pool
+from app.render import rendered_fields, SANITIZER_POLICY_VERSION
 import logging
 
-#proxy middleware import
+#background tasks
+from app.tasks import run_reaper, last_reap
+from app.outbox import run_outbox, enqueue_mail, notify_outbox
+from app.mail import get_sender
+from app.querylog import start_query_log, stop_query_log
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import time
+
+#proxy & rate limit middleware imports
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+from app.ratelimit import RateLimitMiddleware, RateLimit, enforce_rate_limit
+
+#metrics imports
+from app.metrics import MetricsMiddleware, GaugeFunc, render_metrics
+from fastapi.responses import PlainTextResponse
+
+#conditional GET imports
+from app.conditional import conditional_response, has_conditions, make_etag, last_modified
 
 # -------- SETUP & CONFIGURATION --------
 
+#status van de warm-up, voor /readyz
+startup_state = {"ready": False, "stopping": False, "warm_connections": 0, "next_retry": 0.0}
+
+def warmup_statements() -> list:
+    """The hot read queries with dummy parameters. They share their cache keys with the real queries, so warm-up compiles and prepares exactly these."""
+
+    return [
+        user_by_id_query(0),
+        users_page_query(50),
+        users_page_query(50, 0),
+        posts_page_query(20),
+        posts_page_query(20, (datetime.now(timezone.utc), 0)),
+        select(models.User).where(login_lookup("warmup")),
+        select(models.User).where(login_lookup("warmup@example.com")),
+    ]
+
+#startup & shutdown via lifespan
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger = logging.getLogger("uvicorn.error")
+
+    #slow query log via een achtergrond thread
+    start_query_log()
+
+    #pool warm-up on startup: connecties openen en de hot queries compileren en prepareren, tegelijk een connection test
+    #If session factory not configured, log and skip warm-up
+    statements = warmup_statements()
+    if AsyncSessionLocal is None:
+        logger.error("AsyncSessionLocal not configured; skipping pool warm-up.")
+    else:
+        try:
+            startup_state["warm_connections"] = await warm_pool(engine, settings.DB_WARMUP_CONNECTIONS, statements)
+            logger.info("Pool warm-up opened %d connections.", startup_state["warm_connections"])
+        except Exception as e:
+            logger.exception("Pool warm-up failed: %s", e)
+
+    #read replicas eerst checken, zodat GET requests meteen naar een gezonde, warme replica gaan
+    replica_checker = None
+    if replicas is not None and replicas.engines:
+        await replicas.check_all()
+        for replica, healthy in zip(replicas.engines, replicas.healthy):
+            if healthy:
+                try:
+                    await warm_pool(replica, settings.DB_WARMUP_CONNECTIONS, statements)
+                except Exception as e:
+                    logger.warning("Pool warm-up of a read replica failed: %s", e)
+        replica_checker = asyncio.create_task(replicas.run(settings.DB_REPLICA_CHECK_SECONDS))
+
+    #hashing workers starten, zodat de eerste login niet op een nieuwe worker wacht
+    try:
+        await warm_hash_pool()
+    except Exception as e:
+        logger.exception("Hashing pool warm-up failed: %s", e)
+    startup_state["ready"] = startup_state["warm_connections"] > 0
+
+    #reaper voor verlopen tokens en password resets
+    reaper = None
+    if engine is not None and settings.REAPER_INTERVAL_SECONDS > 0:
+        reaper = asyncio.create_task(run_reaper(settings.REAPER_INTERVAL_SECONDS, settings.REAPER_BATCH_SIZE))
+
+    #outbox worker, verstuurt mails buiten de requests om
+    outbox_worker = None
+    if engine is not None and settings.OUTBOX_POLL_SECONDS > 0:
+        try:
+            outbox_worker = asyncio.create_task(run_outbox(get_sender(), settings.OUTBOX_POLL_SECONDS, settings.OUTBOX_BATCH_SIZE))
+        except ValueError as e:
+            logger.error("Outbox worker not started: %s", e)
+
+    yield
+
+    #/readyz meteen 503 laten geven, zodat de load balancer geen nieuwe requests meer stuurt
+    startup_state["stopping"] = True
+    startup_state["ready"] = False
+
+    for task in (reaper, replica_checker, outbox_worker):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    #hashing worker pool afsluiten bij shutdown
+    shutdown_hash_executor()
+    stop_query_log()
+
 #app setup
 app = FastAPI(
     title="Safe API - GDC Ian",
@@ -39,30 +155,27 @@ app = FastAPI(
         "name": "MIT License",
         "url": "https://opensource.org/licenses/MIT",
     },
+    lifespan=lifespan,
 )
 
-#logging setup
+#latency & DB metrics per route, binnenste middleware zodat ze de route kent
 app.add_middleware(
-    ProxyHeadersMiddleware,
-    trusted_hosts="*"
+    MetricsMiddleware,
+    exempt_paths=("/metrics", "/healthz", "/readyz")
 )
 
-#database connection test on startup
-@app.on_event("startup")
-async def on_startup():
-    logger = logging.getLogger("uvicorn.error")
-
-    #If session factory not configured, log and skip test
-    if AsyncSessionLocal is None:
-        logger.error("AsyncSessionLocal not configured; skipping DB connection test.")
-        return
+#rate limit per client IP, toegevoegd voor de proxy middleware zodat die eerst de echte IP invult
+app.add_middleware(
+    RateLimitMiddleware,
+    limit=settings.RATE_LIMIT_DEFAULT,
+    exempt_paths=("/metrics", "/healthz", "/readyz")
+)
 
-    try:
-        async with AsyncSessionLocal() as session:
-            await session.execute(select(1)) #simple test query
-        logger.info("Database connection test succeeded.")
-    except Exception as e:
-        logger.exception("Database connection test failed: %s", e)
+#client IP uit X-Forwarded-For, enkel van de vertrouwde proxies: de rate limits per IP steunen hierop
+app.add_middleware(
+    ProxyHeadersMiddleware,
+    trusted_hosts=settings.FORWARDED_ALLOW_IPS
+)
 
 # -------- ROOT & TESTING ENDPOINTS --------
 
@@ -71,22 +184,153 @@ async def read_root(request: Request):
     """Root endpoint returning a welcome message and client IP address."""
     return {"message": "Hello, welcome to the Safe API! GDC research project by Ian-Chains Baute.", "client_host": request.client.host}
 
+#toont welke volumes en hit rates er zijn, dus enkel voor admins; /metrics heeft dezelfde cijfers voor monitoring
+@app.get("/cache/stats")
+async def get_cache_stats(payload: dict = Depends(require_level(settings.CACHE_STATS_ACCESS_LEVEL, request_session=False))):
+    """Return hit/miss counters of the in-process user cache. Admins only."""
+    return {"users": user_cache.stats()}
+
+#gauges die pas bij het scrapen uitgelezen worden
+GaugeFunc("db_pool_checked_out", "Pool connections currently checked out.", lambda: pool_stats()["checked_out"])
+GaugeFunc("db_pool_size", "Configured pool size (without overflow).", lambda: pool_stats()["size"])
+GaugeFunc("db_replicas_healthy", "Read replicas currently in rotation.", lambda: replicas.healthy_count())
+GaugeFunc("argon2_pending", "Hash/verify jobs running or queued in the hashing pool.", hash_pool_pending)
+GaugeFunc("user_cache_hits_total", "User cache hits.", lambda: user_cache.hits, "counter")
+GaugeFunc("user_cache_misses_total", "User cache misses.", lambda: user_cache.misses, "counter")
+GaugeFunc("user_cache_loads_total", "User cache loads from the DB.", lambda: user_cache.loads, "counter")
+GaugeFunc("user_cache_size", "Entries in the user cache.", lambda: user_cache.stats()["size"])
+GaugeFunc("reaper_last_refresh_tokens_deleted", "Refresh tokens deleted in the last reaper pass.", lambda: last_reap["refresh_tokens"])
+GaugeFunc("reaper_last_password_resets_deleted", "Password resets deleted in the last reaper pass.", lambda: last_reap["password_resets"])
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Expose request, DB, pool, Argon2 and cache metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# -------- HEALTH ENDPOINTS --------
+
+#max wachttijd en minimale tussentijd als /readyz na een mislukte warm-up de database opnieuw probeert
+READY_RETRY_TIMEOUT = 2
+READY_RETRY_INTERVAL = 5
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe: 200 as long as the event loop answers. Does not touch the database, a DB outage should not restart workers."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """Readiness probe: 200 when the pool is warm and has spare connections, otherwise 503 so the load balancer routes to other workers."""
+
+    #database was onbereikbaar bij het opstarten: hoogstens om de READY_RETRY_INTERVAL seconden één connectie testen,
+    #de volledige warm-up blijft voor de startup; de statements worden bij de eerste requests alsnog geprepared
+    now = time.monotonic()
+    if not startup_state["ready"] and not startup_state["stopping"] and now >= startup_state["next_retry"]:
+        startup_state["next_retry"] = now + READY_RETRY_INTERVAL #ook gelijktijdige probes wachten
+        with suppress(Exception):
+            startup_state["warm_connections"] = await asyncio.wait_for(warm_pool(engine, 1), READY_RETRY_TIMEOUT)
+            startup_state["ready"] = startup_state["warm_connections"] > 0
+
+    saturation = pool_saturation()
+    checks = {
+        "warm": startup_state["ready"],
+        "pool_available": saturation is None or saturation < settings.READY_MAX_POOL_SATURATION,
+        "hash_queue_available": hash_pool_pending() < max(1, settings.HASH_WORKERS) + settings.HASH_QUEUE_SIZE,
+    }
+    ready = all(checks.values()) and not startup_state["stopping"]
+    if not ready:
+        response.status_code = 503
+
+    return {
+        "status": "ready" if ready else ("stopping" if startup_state["stopping"] else "not ready"),
+        "checks": checks,
+        "pool_saturation": round(saturation, 3) if saturation is not None else None,
+        "pool_checked_out": pool_stats()["checked_out"],
+        "replicas_healthy": replicas.healthy_count() if replicas is not None else 0,
+    }
+
 # -------- USER ENDPOINTS --------
 
-@app.get("/users")
-async def get_users(db: AsyncSession = Depends(get_db)):
-    """Retrieve all users and their information from the database."""
-    
-    result = await db.execute(select(models.User))
-    users = result.scalars().all() #scalars() haalt alle kolommen op, all() zet om in lijst
-    return users
+#response models, enkel publieke kolommen en door pydantic rechtstreeks naar JSON bytes geserialiseerd
+class UserPublic(BaseModel):
+    """Public data of a user."""
+    id: int
+    username: str
+    email: str
+    role: int
+    created_at: datetime
+    updated_at: datetime
+    last_login_at: datetime | None = None
+
+class UserPage(BaseModel):
+    """A page of users with the cursor for the next page."""
+    items: list[UserPublic]
+    next_cursor: int | None = None
+
+class UserSummary(BaseModel):
+    """Minimal user data, returned after login and token refresh."""
+    id: int
+    username: str
+    email: str
+
+class UserCreated(UserSummary):
+    """A newly created user."""
+    created_at: datetime
 
-@app.get("/users/{user_id}")
-async def get_user_by_id(user_id: int, db: AsyncSession = Depends(get_db)):
-    """Retrieve a user by their ID from the database."""
+def users_page_query(limit: int, after: int | None = None):
+    """Query for one page of users after the cursor, with one extra row to detect a next page."""
 
-    result = await db.execute(select(models.User).where(models.User.id == user_id))
-    user = result.scalars().first() #scalars() haalt alle kolommen op, first() haalt de eerste rij op
+    query = select(*models.USER_PUBLIC_COLUMNS).order_by(models.User.id).limit(limit + 1)
+    if after is not None:
+        query = query.where(models.User.id > after)
+    return query
+
+@app.get("/users", response_model=UserPage)
+async def get_users(request: Request, response: Response, limit: int = Query(50, ge=1, le=200), after: int | None = Query(None, ge=0), db: AsyncSession = Depends(get_read_db)):
+    """Retrieve a page of users, ordered by id. Pass `next_cursor` as `after` to get the next page. Supports conditional GET."""
+
+    result = await db.execute(users_page_query(limit, after))
+    users = [dict(row) for row in result.mappings()] #mappings() geeft lichte rijen terug in plaats van User objecten
+
+    #één extra rij ophalen om te weten of er nog een volgende pagina is
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = users[-1]["id"]
+
+    #ETag over (id, updated_at) van de pagina, bij een 304 valt de serialisatie weg
+    #geen Last-Modified: een verwijderde user verandert de max updated_at niet, enkel de ids in de ETag
+    etag = make_etag("users", next_cursor, *((user["id"], user["updated_at"]) for user in users))
+    not_modified = conditional_response(request, response, etag, None)
+    if not_modified:
+        return not_modified
+
+    return {"items": users, "next_cursor": next_cursor}
+
+@app.get("/users/{user_id}", response_model=UserPublic | None)
+async def get_user_by_id(user_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
+    """Retrieve a user by their ID, served from the user cache when possible. Supports conditional GET."""
+
+    #bij een conditional request eerst enkel updated_at ophalen, een 304 laadt de user niet
+    updated_at = None
+    if has_conditions(request):
+        updated_at = await db.scalar(select(models.User.updated_at).where(models.User.id == user_id))
+        if updated_at is not None:
+            not_modified = conditional_response(request, response, make_etag("user", user_id, updated_at), last_modified(updated_at))
+            if not_modified:
+                return not_modified
+
+    try:
+        user = await get_cached_user(user_id)
+        #de cache loopt achter op de DB, opnieuw laden zodat body en ETag bij elkaar horen
+        if user and updated_at is not None and user["updated_at"] != updated_at:
+            invalidate_user(user_id)
+            user = await get_cached_user(user_id)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Could not retrieve user")
+
+    if user:
+        conditional_response(request, response, make_etag("user", user_id, user["updated_at"]), last_modified(user["updated_at"]))
     return user
 
 class UserCreate(BaseModel):
@@ -95,30 +339,51 @@ class UserCreate(BaseModel):
     email: EmailStr
     password: str
 
-@app.post("/users", status_code=201)
+def validate_password(password: str) -> str | None:
+    """Password rules shared by sign-up and password reset. Returns the error message, or None when valid."""
+
+    if not password or len(password) < 8:
+        return "Password must be at least 8 characters long"
+    return None
+
+def validate_new_user(user: UserCreate) -> str | None:
+    """Basic password & input validation for a new user. Returns the error message, or None when valid."""
+
+    if error := validate_password(user.password):
+        return error
+    if not user.username or len(user.username) < 3:
+        return "Username must be at least 3 characters long"
+    if "@" in user.username:
+        return "Username must not contain '@'"
+    if not user.email:
+        return "Email must be provided"
+    return None
+
+@app.post("/users", status_code=201, response_model=UserCreated)
 async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """Create a new user in the database with hashed password."""
 
     #basic password & input validation
-    if not user.password or len(user.password) < 8:
-        raise HTTPException(status_code=422, detail="Password must be at least 8 characters long")
-    if not user.username or len(user.username) < 3:
-        raise HTTPException(status_code=422, detail="Username must be at least 3 characters long")
-    if not user.email:
-        raise HTTPException(status_code=422, detail="Email must be provided")
+    error = validate_new_user(user)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
 
-    # check for existing username or email
-    result = await db.execute(select(models.User).where((models.User.username == user.username) | (models.User.email == user.email)))
-    existing = result.scalars().first()
+    # check for existing username or email, hoofdletters tellen niet mee (zelfde regel als de unieke indexes)
+    result = await db.execute(
+        select(models.User.username, models.User.email)
+        .where(or_(func.lower(models.User.username) == user.username.lower(), func.lower(models.User.email) == user.email.lower()))
+    )
+    existing = result.first()
     if existing:
-        if existing.username == user.username:
+        if existing.username.lower() == user.username.lower():
             raise HTTPException(status_code=409, detail="Username already exists")
-        if existing.email == user.email:
-            raise HTTPException(status_code=409, detail="Email already exists")
+        raise HTTPException(status_code=409, detail="Email already exists")
 
     #password hashing
     try:
         password_hash = await create_password_hash(user.password)
+    except HashingBusyError:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again later", headers={"Retry-After": "1"})
     except RuntimeError:
         raise HTTPException(status_code=500, detail="Password hashing failed")
 
@@ -135,9 +400,162 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
         await db.rollback()
         raise HTTPException(status_code=500, detail="Could not create user")
 
+    #een eerder gecachte "niet gevonden" voor deze id is niet meer geldig
+    invalidate_user(new_user.id)
+
     #return new user data
     return {"id": new_user.id, "username": new_user.username, "email": new_user.email, "created_at": new_user.created_at}
 
+IMPORT_CSV_COLUMNS = {"username", "email", "password"}
+
+class ImportRowResult(BaseModel):
+    """Result of one row of a bulk import: created (with id), duplicate, conflict or invalid (with detail)."""
+    row: int
+    status: Literal["created", "duplicate", "conflict", "invalid"]
+    id: int | None = None
+    detail: str | None = None
+
+class ImportReport(BaseModel):
+    """Result of a bulk import."""
+    created: int
+    failed: int
+    results: list[ImportRowResult]
+
+async def read_import_body(request: Request) -> bytes:
+    """Read the request body, with a 413 as soon as it is known to exceed IMPORT_MAX_BYTES."""
+
+    too_large = HTTPException(status_code=413, detail=f"Import body is larger than {settings.IMPORT_MAX_BYTES} bytes")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.IMPORT_MAX_BYTES:
+        raise too_large
+
+    #Content-Length kan ontbreken (chunked) of liegen, dus ook tijdens het lezen tellen
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > settings.IMPORT_MAX_BYTES:
+            raise too_large
+    return bytes(body)
+
+async def read_import_rows(request: Request) -> list:
+    """Read the rows of a bulk import: a JSON array of objects, a text/csv body or a multipart upload in the `file` field."""
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in ("application/json", "multipart/form-data", "text/csv"):
+        raise HTTPException(status_code=415, detail="Use application/json, text/csv or multipart/form-data")
+    body = await read_import_body(request)
+
+    if content_type == "application/json":
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Invalid JSON")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=422, detail="Expected a JSON array of users")
+        return rows
+
+    if content_type == "multipart/form-data":
+        async def replay_body():
+            yield body
+        try:
+            form = await MultiPartParser(request.headers, replay_body()).parse()
+        except MultiPartException as e:
+            raise HTTPException(status_code=422, detail=e.message)
+        try:
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=422, detail="Expected a CSV file in the 'file' field")
+            data = await upload.read()
+        finally:
+            await form.close()
+    else:
+        data = body
+
+    try:
+        reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+        if not IMPORT_CSV_COLUMNS.issubset(reader.fieldnames or ()):
+            raise HTTPException(status_code=422, detail="CSV must have the columns username, email and password")
+        return list(reader)
+    except (UnicodeDecodeError, csv.Error):
+        raise HTTPException(status_code=422, detail="Invalid CSV")
+
+@app.post("/users/import", response_model=ImportReport, response_model_exclude_none=True)
+async def import_users(request: Request, payload: dict = Depends(require_level(settings.IMPORT_ACCESS_LEVEL)), db: AsyncSession = Depends(get_db)):
+    """Create many users at once from a JSON array or CSV. Returns a result per row (1-based), valid rows are created even when others fail."""
+
+    rows = await read_import_rows(request)
+    if len(rows) > settings.IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.IMPORT_MAX_ROWS} users per import")
+
+    results = [None] * len(rows)
+    valid = {}  # row index -> UserCreate
+    seen_usernames, seen_emails = set(), set()
+    for index, row in enumerate(rows):
+        try:
+            user = UserCreate.model_validate(row)
+        except ValidationError as e:
+            results[index] = {"row": index + 1, "status": "invalid", "detail": "; ".join(f"{'.'.join(map(str, err['loc'])) or 'row'}: {err['msg']}" for err in e.errors())}
+            continue
+        error = validate_new_user(user)
+        if error:
+            results[index] = {"row": index + 1, "status": "invalid", "detail": error}
+        elif user.username.lower() in seen_usernames or user.email.lower() in seen_emails:
+            results[index] = {"row": index + 1, "status": "duplicate", "detail": "Username or email appears earlier in this import"}
+        else:
+            seen_usernames.add(user.username.lower())
+            seen_emails.add(user.email.lower())
+            valid[index] = user
+
+    #bestaande users in één set-based query, via ix_users_username_lower en ix_users_email_lower
+    if valid:
+        usernames = bindparam("usernames", list(seen_usernames), type_=ARRAY(String))
+        emails = bindparam("emails", list(seen_emails), type_=ARRAY(String))
+        result = await db.execute(
+            select(models.User.username, models.User.email)
+            .where(or_(func.lower(models.User.username) == any_(usernames), func.lower(models.User.email) == any_(emails)))
+        )
+        taken_usernames, taken_emails = set(), set()
+        for username, email in result:
+            taken_usernames.add(username.lower())
+            taken_emails.add(email.lower())
+        for index, user in list(valid.items()):
+            if user.username.lower() in taken_usernames or user.email.lower() in taken_emails:
+                detail = "Username already exists" if user.username.lower() in taken_usernames else "Email already exists"
+                results[index] = {"row": index + 1, "status": "conflict", "detail": detail}
+                del valid[index]
+
+    #alle wachtwoorden parallel hashen over de workers van de hashing pool
+    try:
+        hashes = await hash_passwords([user.password for user in valid.values()], settings.IMPORT_HASH_CHUNK_SIZE)
+    except HashingBusyError:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again later", headers={"Retry-After": "5"})
+    except RuntimeError:
+        raise HTTPException(status_code=500, detail="Password hashing failed")
+
+    #multi-row INSERT ... ON CONFLICT DO NOTHING, SQLAlchemy verdeelt de rijen over statements van max 1000 rijen
+    created = {}
+    if valid:
+        values = [{"username": user.username, "email": user.email, "password_hash": password_hash} for user, password_hash in zip(valid.values(), hashes, strict=True)]
+        statement = pg_insert(models.User).on_conflict_do_nothing().returning(models.User.id, models.User.username)
+        try:
+            result = await db.execute(statement, values)
+            created = {username: user_id for user_id, username in result}
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail="Could not import users")
+
+    for index, user in valid.items():
+        user_id = created.get(user.username)
+        if user_id is None:
+            #tussen de check en de insert door iemand anders aangemaakt
+            results[index] = {"row": index + 1, "status": "conflict", "detail": "Username or email already exists"}
+        else:
+            results[index] = {"row": index + 1, "status": "created", "id": user_id}
+            invalidate_user(user_id)
+
+    return {"created": len(created), "failed": len(rows) - len(created), "results": results}
+
 # -------- AUTHENTICATION ENDPOINTS --------
 
 class LoginRequest(BaseModel):
@@ -145,42 +563,703 @@ class LoginRequest(BaseModel):
     username_or_email: str
     password: str
 
-@app.post("/login")
-async def login(credentials: LoginRequest, response: Response, db: AsyncSession = Depends(get_db)):
+#login limieten, per IP en per account
+LOGIN_LIMIT_IP = RateLimit(settings.RATE_LIMIT_LOGIN_IP, "RATE_LIMIT_LOGIN_IP")
+LOGIN_LIMIT_USER = RateLimit(settings.RATE_LIMIT_LOGIN_USER, "RATE_LIMIT_LOGIN_USER")
+
+async def limit_login_attempts(request: Request, credentials: LoginRequest):
+    """Throttle login attempts per client IP and per username/email, before any DB query or hashing."""
+
+    client_host = request.client.host if request.client else "unknown"
+    await enforce_rate_limit(f"login:ip:{client_host}", LOGIN_LIMIT_IP)
+    await enforce_rate_limit(f"login:user:{credentials.username_or_email.strip().lower()}", LOGIN_LIMIT_USER)
+
+def login_lookup(username_or_email: str, legacy_username: bool = False):
+    """WHERE clause for a login identifier: email when it contains '@', otherwise username, case-insensitive via the lower() indexes.
+
+    With legacy_username the identifier is always matched as a username, for accounts from before usernames with '@' were rejected.
+    """
+
+    #één kolom per lookup, een OR over twee indexes wordt een BitmapOr of seq scan
+    value = username_or_email.strip().lower()
+    column = models.User.email if "@" in value and not legacy_username else models.User.username
+    return func.lower(column) == value
+
+async def find_login_user(db: AsyncSession, username_or_email: str):
+    """User for a login identifier, or None."""
+
+    result = await db.execute(select(models.User).where(login_lookup(username_or_email)))
+    user = result.scalars().first()
+    #oude usernames met '@' (zie migratie 004): tweede index seek, enkel als er geen email overeenkwam
+    if user is None and "@" in username_or_email:
+        result = await db.execute(select(models.User).where(login_lookup(username_or_email, legacy_username=True)))
+        user = result.scalars().first()
+    return user
+
+@app.post("/login", dependencies=[Depends(limit_login_attempts)], response_model=UserSummary)
+async def login(credentials: LoginRequest, request: Request, response: Response, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
     """Authenticate user and return JWT token."""
 
     # find user by username or email
-    result = await db.execute(select(models.User).where((models.User.username == credentials.username_or_email) | (models.User.email == credentials.username_or_email)))
-    user = result.scalars().first()
+    user = await find_login_user(db, credentials.username_or_email)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     #verify password using helper
     try:
         verified = await verify_password(user.password_hash, credentials.password)
+    except HashingBusyError:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again later", headers={"Retry-After": "1"})
     except RuntimeError:
         raise HTTPException(status_code=500, detail="Password verification failed")
     if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    #hash upgraden naar de huidige Argon2 parameters, na de response
+    if password_needs_rehash(user.password_hash):
+        background_tasks.add_task(rehash_user_password, user.id, user.password_hash, credentials.password)
+
+    #last_login_at bijwerken na de response
+    background_tasks.add_task(record_login, user.id)
+
+    #refresh token aanmaken, zodat de client niet telkens opnieuw moet inloggen (en Argon2 betalen)
+    try:
+        refresh_token, session = await create_refresh_token(db, user.id, parse_client_ip(request.client.host if request.client else None), request.headers.get("user-agent"))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Could not create session")
+
     #generate JWT token using helper
     try:
-        token, exp = await create_jwt_token(user.id, user.username, user.role)
+        token, exp = await create_jwt_token(user.id, user.username, user.role, session_id=session.id)
     except RuntimeError:
         raise HTTPException(status_code=500, detail="Token generation failed")
     
-    #create secure cookie with token
+    set_auth_cookies(response, token, refresh_token)
+
+    #return token and expiration time
+    return {"id": user.id, "username": user.username, "email": user.email}
+
+def set_auth_cookies(response: Response, access_token: str, refresh_token: str):
+    """Set the access and refresh tokens as secure, httponly cookies."""
+
     try:
         response.set_cookie(
             key="access_token",
-            value=token,
+            value=access_token,
             httponly=True,
             secure=True,
             samesite="Strict",
             max_age=settings.JWT_EXP_MINUTES * 60
         )
+        response.set_cookie(
+            key="refresh_token",
+            value=refresh_token,
+            httponly=True,
+            secure=True,
+            samesite="Strict",
+            max_age=settings.REFRESH_TOKEN_EXP_DAYS * 24 * 60 * 60
+        )
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to set authentication cookie")
 
-    #return token and expiration time
-    return {"id": user.id, "username": user.username, "email": user.email}
\ No newline at end of file
+@app.post("/token/refresh", response_model=UserSummary)
+async def refresh_access_token(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """Exchange a refresh token for a new access token and a new refresh token (rotation)."""
+
+    raw_token = request.cookies.get("refresh_token")
+    if not raw_token:
+        raise HTTPException(status_code=401, detail="Missing refresh token")
+
+    #rij vergrendelen, zodat dezelfde token niet twee keer tegelijk ingeruild kan worden
+    result = await db.execute(select(models.RefreshToken).where(models.RefreshToken.token == hash_refresh_token(raw_token)).with_for_update())
+    stored = result.scalars().first()
+    if not stored or stored.revoked:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+    #hergebruik van een ingeruilde token: alle sessies van de user intrekken
+    if stored.token_type == ROTATED_TOKEN_TYPE:
+        try:
+            revoked_ids = await revoke_user_sessions(db, stored.user_id)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail="Could not revoke sessions")
+        for session_id in revoked_ids:
+            revocations.add(session_id)
+        raise HTTPException(status_code=401, detail="Refresh token reuse detected")
+
+    now = datetime.now(timezone.utc)
+    if stored.expires_at <= now:
+        raise HTTPException(status_code=401, detail="Refresh token expired")
+
+    user = await get_cached_user(stored.user_id)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+
+    #oude token markeren als ingeruild en een nieuwe uitgeven
+    stored.token_type = ROTATED_TOKEN_TYPE
+    stored.last_used_at = now
+    try:
+        refresh_token, session = await create_refresh_token(db, stored.user_id, parse_client_ip(request.client.host if request.client else None), request.headers.get("user-agent"))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Could not rotate refresh token")
+
+    try:
+        token, exp = await create_jwt_token(user["id"], user["username"], user["role"], session_id=session.id)
+    except RuntimeError:
+        raise HTTPException(status_code=500, detail="Token generation failed")
+
+    set_auth_cookies(response, token, refresh_token)
+    return {"id": user["id"], "username": user["username"], "email": user["email"]}
+
+@app.post("/logout")
+async def logout(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """Revoke the current refresh token and clear the authentication cookies."""
+
+    raw_token = request.cookies.get("refresh_token")
+    if raw_token:
+        query = (
+            update(models.RefreshToken)
+            .where(models.RefreshToken.token == hash_refresh_token(raw_token), models.RefreshToken.revoked.is_(False))
+            .values(revoked=True, revoked_at=func.now(), last_used_at=datetime.now(timezone.utc))
+            .returning(models.RefreshToken.id)
+        )
+        try:
+            result = await db.execute(query)
+            session_id = result.scalars().first()
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail="Could not revoke session")
+
+        #access tokens van deze sessie meteen weigeren in deze worker
+        if session_id is not None:
+            revocations.add(session_id)
+
+    response.delete_cookie("access_token", httponly=True, secure=True, samesite="Strict")
+    response.delete_cookie("refresh_token", httponly=True, secure=True, samesite="Strict")
+    return {"detail": "Logged out"}
+
+# -------- PASSWORD RESET ENDPOINTS --------
+
+class PasswordResetRequest(BaseModel):
+    """Model for requesting a password reset link."""
+    email: EmailStr
+
+class PasswordResetConfirm(BaseModel):
+    """Model for setting a new password with a reset token."""
+    token: str
+    new_password: str
+
+class DetailMessage(BaseModel):
+    """A human readable status message."""
+    detail: str
+
+PASSWORD_RESET_SUBJECT = "Reset your password"
+PASSWORD_RESET_BODY = """Someone asked to reset the password of your account.
+
+Use this link within {minutes} minutes to choose a new password:
+{url}
+
+If this wasn't you, you can ignore this mail. Your password stays the same.
+"""
+
+#reset limieten, per IP en per e-mailadres
+RESET_LIMIT_IP = RateLimit(settings.RATE_LIMIT_RESET_IP, "RATE_LIMIT_RESET_IP")
+RESET_LIMIT_EMAIL = RateLimit(settings.RATE_LIMIT_RESET_EMAIL, "RATE_LIMIT_RESET_EMAIL")
+
+async def limit_reset_requests(request: Request, body: PasswordResetRequest):
+    """Throttle reset requests per client IP and per email, so the endpoint cannot be used to flood a mailbox."""
+
+    client_host = request.client.host if request.client else "unknown"
+    await enforce_rate_limit(f"reset:ip:{client_host}", RESET_LIMIT_IP)
+    await enforce_rate_limit(f"reset:email:{body.email.strip().lower()}", RESET_LIMIT_EMAIL)
+
+@app.post("/password-reset", status_code=202, dependencies=[Depends(limit_reset_requests)], response_model=DetailMessage)
+async def request_password_reset(body: PasswordResetRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    """Store a reset token and queue the reset mail in one transaction. The mail is sent by the outbox worker, the same answer is given for unknown emails."""
+
+    result = await db.execute(select(models.User.id, models.User.email).where(login_lookup(body.email)))
+    user = result.first()
+    if user:
+        raw_token = create_password_reset(db, user.id, parse_client_ip(request.client.host if request.client else None), request.headers.get("user-agent"))
+        enqueue_mail(db, "password_reset", user.email, PASSWORD_RESET_SUBJECT, PASSWORD_RESET_BODY.format(
+            minutes=settings.PASSWORD_RESET_EXP_MINUTES,
+            url=settings.PASSWORD_RESET_URL.format(token=raw_token),
+        ))
+        try:
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise HTTPException(status_code=500, detail="Could not start password reset")
+        notify_outbox()
+
+    return {"detail": "If an account with this email exists, a reset link is on its way"}
+
+@app.post("/password-reset/confirm", response_model=DetailMessage)
+async def confirm_password_reset(body: PasswordResetConfirm, db: AsyncSession = Depends(get_db)):
+    """Set a new password with a reset token. Uses the token up, invalidates other open resets and revokes all sessions of the user."""
+
+    error = validate_password(body.new_password)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+
+    token_hash = hash_refresh_token(body.token)
+    valid_reset = (
+        models.PasswordReset.reset_token == token_hash,
+        models.PasswordReset.used.is_(False),
+        models.PasswordReset.expires_at > func.now(),
+    )
+    reset_id = await db.scalar(select(models.PasswordReset.id).where(*valid_reset))
+    if reset_id is None:
+        raise HTTPException(status_code=400, detail="Invalid or expired reset token")
+
+    #eerst hashen, pas daarna de token claimen: geen rij lock tijdens Argon2
+    try:
+        password_hash = await create_password_hash(body.new_password)
+    except HashingBusyError:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again later", headers={"Retry-After": "1"})
+    except RuntimeError:
+        raise HTTPException(status_code=500, detail="Password hashing failed")
+
+    now = datetime.now(timezone.utc)
+    try:
+        #atomisch claimen, een tweede request met dezelfde token vindt geen rij meer
+        user_id = await db.scalar(
+            update(models.PasswordReset)
+            .where(models.PasswordReset.id == reset_id, *valid_reset)
+            .values(used=True, used_at=now)
+            .returning(models.PasswordReset.user_id)
+        )
+        if user_id is None:
+            await db.rollback()
+            raise HTTPException(status_code=400, detail="Invalid or expired reset token")
+
+        await db.execute(update(models.User).where(models.User.id == user_id).values(password_hash=password_hash, updated_at=now))
+        #oudere reset links van deze user vervallen ook
+        await db.execute(
+            update(models.PasswordReset)
+            .where(models.PasswordReset.user_id == user_id, models.PasswordReset.used.is_(False))
+            .values(used=True, used_at=now)
+        )
+        revoked_ids = await revoke_user_sessions(db, user_id)
+        await db.commit()
+    except HTTPException:
+        raise
+    except Exception:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Could not reset password")
+
+    #ingetrokken sessies meteen weigeren in deze worker, updated_at in de cache is verouderd
+    for session_id in revoked_ids:
+        revocations.add(session_id)
+    invalidate_user(user_id)
+
+    return {"detail": "Password has been reset"}
+
+# -------- POST & COMMENT ENDPOINTS --------
+
+#kolommen voor lijsten, auteur via een join in dezelfde query (geen lazy loads per rij)
+POST_LIST_COLUMNS = (
+    models.Post.id,
+    models.Post.title,
+    models.Post.content_mime,
+    models.Post.created_at,
+    models.Post.updated_at,
+    models.Post.author_id,
+    models.User.username.label("author_username"),
+)
+#gecachte gesanitizede HTML, de bron enkel als de cache verouderd is (andere policy versie)
+class PostSummary(BaseModel):
+    """Post metadata with its author."""
+    id: int
+    title: str
+    content_mime: str | None = None
+    created_at: datetime
+    updated_at: datetime
+    author_id: int
+    author_username: str
+
+class PostListItem(PostSummary):
+    """A post in a list, with its number of comments."""
+    comment_count: int
+
+class PostPage(BaseModel):
+    """A page of posts with the cursor for the next page."""
+    items: list[PostListItem]
+    next_cursor: str | None = None
+
+class CommentPublic(BaseModel):
+    """A comment with its author and sanitized HTML content."""
+    id: int
+    post_id: int
+    content: str
+    created_at: datetime
+    updated_at: datetime
+    author_id: int
+    author_username: str
+
+class CommentPage(BaseModel):
+    """A page of comments with the cursor for the next page."""
+    items: list[CommentPublic]
+    next_cursor: str | None = None
+
+class PostDetail(PostSummary):
+    """A post with sanitized HTML content and the first page of comments."""
+    content: str
+    comments: list[CommentPublic]
+    comments_next_cursor: str | None = None
+
+def rendered_columns(model):
+    """Columns selecting the cached rendering as `content`, and the source as `source` only when it must be re-rendered."""
+
+    return (
+        model.content_rendered.label("content"),
+        case((model.render_version == SANITIZER_POLICY_VERSION, None), else_=model.content).label("source"),
+    )
+
+COMMENT_COLUMNS = (
+    models.Comment.id,
+    models.Comment.post_id,
+    *rendered_columns(models.Comment),
+    models.Comment.created_at,
+    models.Comment.updated_at,
+    models.Comment.author_id,
+    models.User.username.label("author_username"),
+    models.User.updated_at.label("author_updated_at"),
+)
+
+async def store_rendered(model, rows: list[dict]):
+    """Persist lazily re-rendered content. Runs as a background task after the response."""
+
+    #enkel schrijven als de content sinds de read niet wijzigde en niemand al met een nieuwere policy renderde
+    table = model.__table__
+    query = update(table).where(
+        table.c.id == bindparam("row_id"),
+        func.encode(func.sha256(func.convert_to(table.c.content, "UTF8")), "hex") == bindparam("source_hash"),
+        or_(table.c.render_version.is_(None), table.c.render_version < SANITIZER_POLICY_VERSION),
+    )
+    params = [{**{key: value for key, value in row.items() if key != "id"}, "row_id": row["id"], "source_hash": row["content_hash"]} for row in rows]
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(query, params) #executemany, de overige keys worden de SET kolommen
+            await session.commit()
+    except Exception:
+        logging.getLogger(__name__).exception("Storing re-rendered %s content failed", model.__tablename__)
+
+def apply_rendered(model, rows: list[dict], background_tasks: BackgroundTasks, mime_key: str | None = None):
+    """Fill `content` for rows whose cached rendering is stale, and schedule storing the new renderings."""
+
+    stale = []
+    for row in rows:
+        source = row.pop("source")
+        if source is not None:
+            fields = rendered_fields(source, row.get(mime_key) if mime_key else "text/html")
+            row["content"] = fields["content_rendered"]
+            stale.append({"id": row["id"], **fields})
+    if stale:
+        background_tasks.add_task(store_rendered, model, stale)
+    return rows
+
+def parse_cursor(after: str | None):
+    """Decode an `after` query parameter, raising 422 when it is not a valid cursor."""
+
+    if after is None:
+        return None
+    try:
+        return decode_cursor(after)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+def page_with_cursor(rows: list[dict], limit: int):
+    """Cut a limit+1 result down to limit rows and build the cursor for the next page."""
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return rows, None
+
+async def fetch_comments(db: AsyncSession, post_id: int, limit: int, after: str | None, background_tasks: BackgroundTasks):
+    """Fetch one page of comments for a post, oldest first, with their authors and sanitized content. One query."""
+
+    cursor = parse_cursor(after)
+    query = (
+        select(*COMMENT_COLUMNS)
+        .join(models.User, models.User.id == models.Comment.author_id)
+        .where(models.Comment.post_id == post_id)
+        .order_by(models.Comment.created_at, models.Comment.id) #gebruikt ix_comments_post_id_created_at
+        .limit(limit + 1)
+    )
+    if cursor:
+        query = query.where(tuple_(models.Comment.created_at, models.Comment.id) > tuple_(*cursor))
+
+    result = await db.execute(query)
+    comments = apply_rendered(models.Comment, [dict(row) for row in result.mappings()], background_tasks)
+    return page_with_cursor(comments, limit)
+
+def posts_page_query(limit: int, cursor: tuple | None = None):
+    """Query for one page of posts before the (created_at, id) cursor, with author and comment count."""
+
+    #aantal comments als scalar subquery, gebruikt de index op (post_id, created_at)
+    comment_count = (
+        select(func.count(models.Comment.id))
+        .where(models.Comment.post_id == models.Post.id)
+        .correlate(models.Post)
+        .scalar_subquery()
+        .label("comment_count")
+    )
+    query = (
+        select(*POST_LIST_COLUMNS, comment_count, models.User.updated_at.label("author_updated_at"))
+        .join(models.User, models.User.id == models.Post.author_id)
+        .order_by(models.Post.created_at.desc(), models.Post.id.desc()) #gebruikt ix_posts_created_at
+        .limit(limit + 1)
+    )
+    if cursor:
+        query = query.where(tuple_(models.Post.created_at, models.Post.id) < tuple_(*cursor))
+    return query
+
+@app.get("/posts", response_model=PostPage)
+async def get_posts(request: Request, response: Response, limit: int = Query(20, ge=1, le=100), after: str | None = None, db: AsyncSession = Depends(get_read_db)):
+    """Retrieve a page of posts, newest first, with author and comment count. Pass `next_cursor` as `after` for the next page. Supports conditional GET."""
+
+    result = await db.execute(posts_page_query(limit, parse_cursor(after)))
+    posts, next_cursor = page_with_cursor([dict(row) for row in result.mappings()], limit)
+
+    #author_updated_at: een nieuwe username verandert de pagina ook; geen Last-Modified, zie get_users
+    etag = make_etag("posts", next_cursor, *((post["id"], post["updated_at"], post["author_updated_at"], post["comment_count"]) for post in posts))
+    not_modified = conditional_response(request, response, etag, None)
+    if not_modified:
+        return not_modified
+
+    return {"items": posts, "next_cursor": next_cursor}
+
+#alles waarvan de response van GET /posts/{post_id} afhangt, samengevat in een paar scalars
+POST_VALIDATOR_COLUMNS = (
+    models.Post.updated_at.label("post_updated_at"),
+    models.User.updated_at.label("author_updated_at"),
+    select(func.count(models.Comment.id)).where(models.Comment.post_id == models.Post.id).correlate(models.Post).scalar_subquery().label("comments_total"),
+    select(func.max(models.Comment.updated_at)).where(models.Comment.post_id == models.Post.id).correlate(models.Post).scalar_subquery().label("comments_updated_at"),
+    #de comments tonen de username van hun auteur
+    select(func.max(models.User.updated_at)).join(models.Comment, models.Comment.author_id == models.User.id).where(models.Comment.post_id == models.Post.id).correlate(models.Post).scalar_subquery().label("comment_authors_updated_at"),
+)
+POST_VALIDATOR_KEYS = tuple(column.key for column in POST_VALIDATOR_COLUMNS)
+
+def post_validators(post_id: int, comments_limit: int, row) -> tuple[str, datetime | None]:
+    """ETag and Last-Modified for a post with its first page of comments, from the POST_VALIDATOR_COLUMNS of `row`."""
+
+    etag = make_etag("post", post_id, comments_limit, SANITIZER_POLICY_VERSION, row["post_updated_at"], row["author_updated_at"], row["comments_total"], row["comments_updated_at"], row["comment_authors_updated_at"])
+    return etag, last_modified(row["post_updated_at"], row["author_updated_at"], row["comments_updated_at"], row["comment_authors_updated_at"])
+
+@app.get("/posts/{post_id}", response_model=PostDetail)
+async def get_post(post_id: int, request: Request, response: Response, background_tasks: BackgroundTasks, comments_limit: int = Query(50, ge=1, le=200), db: AsyncSession = Depends(get_read_db)):
+    """Retrieve a post with its author and the first page of comments, with sanitized HTML content. Supports conditional GET."""
+
+    #conditional request: eerst enkel de validators ophalen (één lichte query), een 304 laadt niets anders
+    if has_conditions(request):
+        result = await db.execute(
+            select(*POST_VALIDATOR_COLUMNS)
+            .join(models.User, models.User.id == models.Post.author_id)
+            .where(models.Post.id == post_id)
+        )
+        validators = result.mappings().first()
+        if validators:
+            not_modified = conditional_response(request, response, *post_validators(post_id, comments_limit, validators))
+            if not_modified:
+                return not_modified
+
+    query = (
+        select(*POST_LIST_COLUMNS, *rendered_columns(models.Post), *POST_VALIDATOR_COLUMNS)
+        .join(models.User, models.User.id == models.Post.author_id)
+        .where(models.Post.id == post_id)
+    )
+    result = await db.execute(query)
+    post = result.mappings().first()
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    conditional_response(request, response, *post_validators(post_id, comments_limit, post))
+
+    post = {key: value for key, value in post.items() if key not in POST_VALIDATOR_KEYS}
+    post = apply_rendered(models.Post, [post], background_tasks, mime_key="content_mime")[0]
+
+    comments, next_cursor = await fetch_comments(db, post_id, comments_limit, None, background_tasks)
+    return {**post, "comments": comments, "comments_next_cursor": next_cursor}
+
+@app.get("/posts/{post_id}/comments", response_model=CommentPage)
+async def get_post_comments(post_id: int, request: Request, response: Response, background_tasks: BackgroundTasks, limit: int = Query(50, ge=1, le=200), after: str | None = None, db: AsyncSession = Depends(get_read_db)):
+    """Retrieve a page of comments for a post, oldest first. Supports conditional GET."""
+
+    comments, next_cursor = await fetch_comments(db, post_id, limit, after, background_tasks)
+
+    #geen Last-Modified, zie get_users
+    etag = make_etag("comments", post_id, SANITIZER_POLICY_VERSION, next_cursor, *((comment["id"], comment["updated_at"], comment["author_updated_at"]) for comment in comments))
+    not_modified = conditional_response(request, response, etag, None)
+    if not_modified:
+        return not_modified
+
+    return {"items": comments, "next_cursor": next_cursor}
+
+class PostCreate(BaseModel):
+    """Model for creating a new post."""
+    title: str = Field(min_length=1, max_length=255)
+    content: str = Field(min_length=1)
+
+class PostCreated(BaseModel):
+    """A newly created post."""
+    id: int
+    title: str
+    author_id: int
+    created_at: datetime
+
+@app.post("/posts", status_code=201, response_model=PostCreated)
+async def create_post(post: PostCreate, payload: dict = Depends(get_current_claims), db: AsyncSession = Depends(get_db)):
+    """Create a new post as the authenticated user."""
+
+    #HTML één keer sanitizen bij het schrijven, reads geven de gecachte versie terug
+    new_post = models.Post(author_id=int(payload["sub"]), title=post.title, content=post.content, **rendered_fields(post.content))
+    db.add(new_post)
+    try:
+        await db.commit()
+        #created_at zoals de server hem opsloeg (timestamptz), niet de naive default uit Python
+        await db.refresh(new_post, ["created_at"])
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=401, detail="Unknown user")
+    except Exception:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Could not create post")
+
+    return {"id": new_post.id, "title": new_post.title, "author_id": new_post.author_id, "created_at": new_post.created_at}
+
+class CommentCreate(BaseModel):
+    """Model for creating a new comment."""
+    content: str = Field(min_length=1)
+
+class CommentCreated(BaseModel):
+    """A newly created comment, with its sanitized HTML content."""
+    id: int
+    post_id: int
+    author_id: int
+    content: str
+    created_at: datetime
+
+@app.post("/posts/{post_id}/comments", status_code=201, response_model=CommentCreated)
+async def create_comment(post_id: int, comment: CommentCreate, payload: dict = Depends(get_current_claims), db: AsyncSession = Depends(get_db)):
+    """Add a comment to a post as the authenticated user."""
+
+    new_comment = models.Comment(post_id=post_id, author_id=int(payload["sub"]), content=comment.content, **rendered_fields(comment.content))
+    db.add(new_comment)
+    try:
+        await db.commit()
+        #created_at zoals de server hem opsloeg (timestamptz), niet de naive default uit Python
+        await db.refresh(new_comment, ["created_at"])
+    except IntegrityError as e:
+        await db.rollback()
+        #Postgres standaardnamen voor de foreign keys uit structure-postgres.sql
+        constraint = violated_constraint(e)
+        if constraint == "comments_post_id_fkey":
+            raise HTTPException(status_code=404, detail="Post not found")
+        if constraint == "comments_author_id_fkey":
+            raise HTTPException(status_code=401, detail="Unknown user")
+        raise HTTPException(status_code=409, detail="Comment conflicts with existing data")
+    except Exception:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Could not create comment")
+
+    return {"id": new_comment.id, "post_id": new_comment.post_id, "author_id": new_comment.author_id, "content": new_comment.content_rendered, "created_at": new_comment.created_at}
+
+# -------- SEARCH ENDPOINTS --------
+
+#ts_headline opties, <mark> wordt na het escapen van de snippet teruggezet
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=\" ... \""
+
+class SearchHit(BaseModel):
+    """A search result with a highlighted snippet. `title` is only set for posts."""
+    id: int
+    rank: float
+    author_id: int
+    created_at: datetime
+    title: str | None = None
+    snippet: str | None = None
+
+class SearchPage(BaseModel):
+    """A page of search results with the cursor for the next page."""
+    items: list[SearchHit]
+    next_cursor: str | None = None
+
+def safe_snippet(snippet: str | None) -> str | None:
+    """HTML-escape a ts_headline snippet and keep only the <mark> highlights."""
+
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace("&lt;mark&gt;", "<mark>").replace("&lt;/mark&gt;", "</mark>")
+
+@app.get("/search", response_model=SearchPage, response_model_exclude_unset=True)
+async def search(q: str = Query(min_length=1, max_length=200), kind: Literal["posts", "comments"] = "posts", limit: int = Query(20, ge=1, le=100), after: str | None = None, db: AsyncSession = Depends(get_read_db)):
+    """Full-text search over posts or comments, ranked, with highlighted snippets. Pass `next_cursor` as `after` for the next page."""
+
+    cursor = None
+    if after is not None:
+        try:
+            cursor = decode_rank_cursor(after)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Invalid cursor")
+
+    model = models.Post if kind == "posts" else models.Comment
+    tsquery = func.websearch_to_tsquery("simple", q) #ondersteunt "zinnen", OR en -uitsluiten
+    rank = func.ts_rank_cd(model.search_vector, tsquery)
+
+    #eerst enkel id + rank van de pagina bepalen via de GIN index
+    matches = (
+        select(model.id.label("id"), rank.label("rank"))
+        .where(model.search_vector.op("@@")(tsquery))
+        .order_by(rank.desc(), model.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        matches = matches.where(tuple_(rank, model.id) < tuple_(*cursor))
+    matches = matches.subquery()
+
+    #dure ts_headline enkel voor de rijen van deze pagina
+    columns = [model.id, matches.c.rank, model.author_id, model.created_at]
+    if model is models.Post:
+        columns.append(model.title)
+    columns.append(func.ts_headline("simple", model.content_text, tsquery, SEARCH_HEADLINE_OPTIONS).label("snippet"))
+    query = select(*columns).join(matches, matches.c.id == model.id).order_by(matches.c.rank.desc(), model.id.desc())
+
+    result = await db.execute(query)
+    items = [dict(row) for row in result.mappings()]
+    for item in items:
+        item["snippet"] = safe_snippet(item["snippet"])
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_rank_cursor(items[-1]["rank"], items[-1]["id"])
+
+    return {"items": items, "next_cursor": next_cursor}
+
+# -------- EXPORT ENDPOINTS --------
+
+#kolommen per exporteerbare tabel, users zonder password_hash en zonder afgeleide kolommen
+EXPORT_EXCLUDED_COLUMNS = {"search_vector", "content_rendered", "content_text", "content_hash", "render_version"}
+EXPORT_TABLES = {
+    "users": models.USER_PUBLIC_COLUMNS,
+    "posts": tuple(c for c in models.Post.__table__.columns if c.name not in EXPORT_EXCLUDED_COLUMNS),
+    "comments": tuple(c for c in models.Comment.__table__.columns if c.name not in EXPORT_EXCLUDED_COLUMNS),
+}
+
+@app.get("/export/{table}")
+async def export_table(table: Literal["users", "posts", "comments"], payload: dict = Depends(require_level(settings.EXPORT_ACCESS_LEVEL, request_session=False))):
+    """Stream a full table as NDJSON (one JSON object per line) for bulk sync jobs."""
+
+    #geen request session: die zou de hele stream lang een primary connectie vasthouden, stream_ndjson neemt zijn eigen
+
+    #rijen worden per batch gestreamd, het geheugen blijft constant
+    return StreamingResponse(
+        stream_ndjson(EXPORT_TABLES[table], settings.EXPORT_BATCH_SIZE),
+        media_type="application/x-ndjson",
+    )
@@ -0,0 +1,187 @@
+from contextvars import ContextVar
+from bisect import bisect_left
+import time
+
+#standaard buckets in seconden, van 1 ms tot 10 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    """Escape a label value for the Prometheus text format."""
+
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, labels, extra: tuple = ()) -> str:
+    """Format labels as {name="value",...}. `extra` holds additional (name, value) pairs such as le."""
+
+    parts = [f'{name}="{_escape(value)}"' for name, value in (*zip(labelnames, labels), *extra)]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets and optional labels."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        data = self._values.get(labels)
+        if data is None:
+            data = self._values[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            data[index] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, data in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, (('le', '+Inf'),))} {data[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {data[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {data[-1]}")
+        return lines
+
+
+class GaugeFunc:
+    """Metric whose value is read from a callback at scrape time. Use metric_type="counter" for running totals."""
+
+    def __init__(self, name: str, help: str, func, metric_type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.metric_type = metric_type
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        try:
+            value = self.func()
+        except Exception:
+            return []
+        #None: de metric is hier niet van toepassing (bv. geen eigen pool)
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.metric_type}", f"{self.name} {value}"]
+
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text format."""
+
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -------- METRICS --------
+
+http_requests = Counter("http_requests_total", "HTTP requests by method, route and status.", ("method", "route", "status"))
+http_duration = Histogram("http_request_duration_seconds", "HTTP request latency by method and route.", ("method", "route"))
+http_db_queries = Histogram("http_request_db_queries", "DB queries per HTTP request.", ("route",), buckets=(0, 1, 2, 3, 5, 10, 20, 50))
+http_db_time = Histogram("http_request_db_seconds", "Time spent in DB queries per HTTP request.", ("route",))
+db_queries = Counter("db_queries_total", "DB queries executed.")
+db_query_time = Histogram("db_query_duration_seconds", "DB query latency.")
+db_pool_wait = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pool connection, including connects.")
+db_read_sessions = Counter("db_read_sessions_total", "Read-only sessions by target (replica or primary).", ("target",))
+outbox_deliveries = Counter("outbox_deliveries_total", "Outbox mails by outcome (sent, failed and retried later, dead after the last attempt).", ("status",))
+argon2_time = Histogram("argon2_duration_seconds", "Argon2 hash/verify time, including queueing in the hashing pool.", ("operation",), buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+rate_limit_rejections = Counter("rate_limit_rejections_total", "Requests rejected by the rate limiter.", ("scope",))
+
+
+# -------- PER REQUEST DB STATS --------
+
+class RequestStats:
+    """DB query count and time for the current request."""
+
+    __slots__ = ("queries", "db_time", "scope")
+
+    def __init__(self, scope: dict | None = None):
+        self.queries = 0
+        self.db_time = 0.0
+        self.scope = scope
+
+    @property
+    def route(self) -> str:
+        """Route template of the request, or "unmatched" before/without routing."""
+
+        return getattr(self.scope.get("route") if self.scope else None, "path", "unmatched")
+
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+def record_query(duration: float):
+    """Record one executed DB query, globally and for the current request."""
+
+    db_queries.inc()
+    db_query_time.observe(duration)
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += duration
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and DB usage per route."""
+
+    def __init__(self, app, exempt_paths: tuple = ()):
+        self.app = app
+        self.exempt_paths = set(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats(scope)
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            request_stats.reset(token)
+
+            #route template gebruiken (bv. /users/{user_id}), anders explodeert het aantal labels
+            route = stats.route
+            method = scope["method"]
+            http_requests.inc(method, route, status)
+            http_duration.observe(duration, method, route)
+            http_db_queries.observe(stats.queries, route)
+            http_db_time.observe(stats.db_time, route)
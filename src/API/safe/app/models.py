@@ -1,22 +1,23 @@
 from app.config import Base
 
 from datetime import datetime, timedelta
-from sqlalchemy import (Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index)
+from sqlalchemy import (Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index, Computed, func, text)
 
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.dialects.postgresql import INET, TSVECTOR
 
 class User(Base):
     __tablename__ = 'users'
     __table_args__ = (
-        Index('ix_users_username', 'username'),
-        Index('ix_users_email', 'email'),
+        #uniek zonder onderscheid tussen hoofd- en kleine letters, login zoekt op lower(...) met één index seek
+        Index('ix_users_username_lower', func.lower(text('username')), unique=True),
+        Index('ix_users_email_lower', func.lower(text('email')), unique=True),
         {'schema': 'access'}
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    username = Column(String(100), unique=True, nullable=False)
-    email = Column(String(350), unique=True, nullable=False)
+    username = Column(String(100), nullable=False)
+    email = Column(String(350), nullable=False)
     password_hash = Column(Text, nullable=False)
     role = Column(Integer, nullable=False, default=9)
     created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
@@ -30,12 +31,25 @@ class User(Base):
     comments = relationship('Comment', back_populates='author', cascade='all, delete-orphan')
 
 
+#publieke kolommen van een user, password_hash wordt nooit opgehaald
+USER_PUBLIC_COLUMNS = (
+    User.id,
+    User.username,
+    User.email,
+    User.role,
+    User.created_at,
+    User.updated_at,
+    User.last_login_at,
+)
+
+
 class RefreshToken(Base):
     __tablename__ = 'refresh_tokens'
     __table_args__ = (
         Index('ix_refresh_tokens_user_id_created_at', 'user_id', 'created_at'),
         Index('ix_refresh_tokens_token', 'token'),
         Index('ix_refresh_tokens_expires_at', 'expires_at'),
+        Index('ix_refresh_tokens_revoked_at', 'revoked_at', postgresql_where=text('revoked_at IS NOT NULL')),
         {'schema': 'access'}
     )
 
@@ -46,6 +60,7 @@ class RefreshToken(Base):
     created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
     expires_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.utcnow() + timedelta(days=3))
     revoked = Column(Boolean, nullable=False, default=False)
+    revoked_at = Column(DateTime(timezone=True))
     ip = Column(INET)
     user_agent = Column(Text)
     last_used_at = Column(DateTime(timezone=True))
@@ -77,11 +92,44 @@ class PasswordReset(Base):
     user = relationship('User', back_populates='password_resets')
 
 
+class RateLimitEntry(Base):
+    __tablename__ = 'rate_limits'
+    __table_args__ = (
+        Index('ix_rate_limits_tat', 'tat'),
+        {'schema': 'access'}
+    )
+
+    key = Column(Text, primary_key=True)
+    tat = Column(DateTime(timezone=True), nullable=False)  # theoretical arrival time (GCRA)
+
+
+class OutboxMessage(Base):
+    __tablename__ = 'outbox'
+    __table_args__ = (
+        #enkel onverzonden berichten, de worker zoekt op available_at
+        Index('ix_outbox_pending', 'available_at', postgresql_where=text('sent_at IS NULL')),
+        Index('ix_outbox_created_at', 'created_at'),
+        {'schema': 'access'}
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(50), nullable=False)
+    recipient = Column(String(350), nullable=False)
+    subject = Column(Text, nullable=False)
+    body = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    available_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)  # volgende poging
+    attempts = Column(Integer, nullable=False, default=0)
+    sent_at = Column(DateTime(timezone=True))
+    last_error = Column(Text)
+
+
 class Post(Base):
     __tablename__ = 'posts'
     __table_args__ = (
         Index('ix_posts_author_id', 'author_id'),
         Index('ix_posts_created_at', 'created_at'),
+        Index('ix_posts_search_vector', 'search_vector', postgresql_using='gin'),
         {'schema': 'content'}
     )
 
@@ -92,6 +140,11 @@ class Post(Base):
     content_mime = Column(String(50), default='text/html')
     created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    search_vector = Column(TSVECTOR, Computed("setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', coalesce(content_text, '')), 'B')", persisted=True))
+    content_rendered = Column(Text)  # gesanitizede HTML, gemaakt bij het schrijven
+    content_text = Column(Text)  # platte tekst van content_rendered, bron van search_vector
+    content_hash = Column(String(64))  # sha256 van content op het moment van renderen
+    render_version = Column(Integer)  # sanitizer policy versie van content_rendered
 
     # Relationships
     author = relationship('User', back_populates='posts')
@@ -103,6 +156,7 @@ class Comment(Base):
     __table_args__ = (
         Index('ix_comments_post_id_created_at', 'post_id', 'created_at'),
         Index('ix_comments_author_id_created_at', 'author_id', 'created_at'),
+        Index('ix_comments_search_vector', 'search_vector', postgresql_using='gin'),
         {'schema': 'content'}
     )
 
@@ -112,6 +166,11 @@ class Comment(Base):
     content = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    search_vector = Column(TSVECTOR, Computed("to_tsvector('simple', coalesce(content_text, ''))", persisted=True))
+    content_rendered = Column(Text)  # gesanitizede HTML, gemaakt bij het schrijven
+    content_text = Column(Text)  # platte tekst van content_rendered, bron van search_vector
+    content_hash = Column(String(64))  # sha256 van content op het moment van renderen
+    render_version = Column(Integer)  # sanitizer policy versie van content_rendered
 
     # Relationships
     post = relationship('Post', back_populates='comments')
@@ -0,0 +1,109 @@
+from sqlalchemy import select, update, func
+from contextlib import suppress
+from datetime import timedelta
+from app.models import OutboxMessage
+from app.database import engine
+from app.config import settings
+from app.mail import MailSender, build_message
+from app.metrics import outbox_deliveries
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+#maakt de worker in dit proces wakker na een commit, zonder op de volgende poll te wachten
+_wakeup = asyncio.Event()
+
+def enqueue_mail(db, kind: str, recipient: str, subject: str, body: str) -> OutboxMessage:
+    """Add a mail to the outbox in the caller's transaction. The caller commits, then calls notify_outbox()."""
+
+    message = OutboxMessage(kind=kind, recipient=recipient, subject=subject, body=body)
+    db.add(message)
+    return message
+
+def notify_outbox():
+    """Wake up the outbox worker of this process."""
+
+    _wakeup.set()
+
+def _retry_delay(attempts: int) -> int:
+    """Seconds until the next attempt after `attempts` failed ones, doubling up to one hour."""
+
+    return min(3600, settings.OUTBOX_RETRY_SECONDS * 2 ** max(0, attempts - 1))
+
+async def deliver_once(sender: MailSender, batch_size: int) -> dict:
+    """Claim up to `batch_size` due messages, send them and record the outcome. Returns counts per outcome."""
+
+    counts = {"sent": 0, "failed": 0, "dead": 0}
+    async with engine.connect() as conn:
+        #SKIP LOCKED: meerdere workers (en replicas) claimen elk een andere batch, zonder op elkaar te wachten
+        query = (
+            select(OutboxMessage.id, OutboxMessage.recipient, OutboxMessage.subject, OutboxMessage.body, OutboxMessage.attempts)
+            .where(OutboxMessage.sent_at.is_(None), OutboxMessage.available_at <= func.now(), OutboxMessage.attempts < settings.OUTBOX_MAX_ATTEMPTS)
+            .order_by(OutboxMessage.available_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        rows = (await conn.execute(query)).all()
+        if not rows:
+            await conn.rollback()
+            return counts
+
+        #de rijen blijven vergrendeld tijdens het versturen; crasht het proces hier, dan wordt de batch opnieuw verstuurd (at-least-once)
+        messages = [build_message(row.recipient, row.subject, row.body) for row in rows]
+        try:
+            results = await asyncio.to_thread(sender.send_batch, messages)
+        except Exception as e:
+            results = [e] * len(rows)
+
+        sent_ids = [row.id for row, error in zip(rows, results) if error is None]
+        if sent_ids:
+            await conn.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_(sent_ids))
+                .values(sent_at=func.now(), attempts=OutboxMessage.attempts + 1, last_error=None)
+            )
+            counts["sent"] = len(sent_ids)
+
+        for row, error in zip(rows, results):
+            if error is None:
+                continue
+            attempts = row.attempts + 1
+            await conn.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id == row.id)
+                .values(
+                    attempts=attempts,
+                    available_at=func.now() + timedelta(seconds=_retry_delay(attempts)),
+                    last_error=f"{type(error).__name__}: {error}"[:1000],
+                )
+            )
+            if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                counts["dead"] += 1
+                logger.error("Outbox message %d to %s given up after %d attempts: %s", row.id, row.recipient, attempts, error)
+            else:
+                counts["failed"] += 1
+                logger.warning("Outbox message %d to %s failed (attempt %d): %s", row.id, row.recipient, attempts, error)
+        await conn.commit()
+
+    for status, count in counts.items():
+        if count:
+            outbox_deliveries.inc(status, amount=count)
+    return counts
+
+async def run_outbox(sender: MailSender, interval: float, batch_size: int):
+    """Background loop that drains the outbox in batches, after every notify_outbox() and at least every `interval` seconds."""
+
+    while True:
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_wakeup.wait(), interval)
+        _wakeup.clear()
+
+        try:
+            #volle batch: er staat waarschijnlijk nog meer klaar
+            while sum((await deliver_once(sender, batch_size)).values()) >= batch_size:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Outbox delivery pass failed")
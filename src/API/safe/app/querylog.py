@@ -0,0 +1,91 @@
+from logging.handlers import QueueHandler, QueueListener
+from functools import lru_cache
+from app.config import settings
+from app.metrics import request_stats
+import hashlib
+import logging
+import random
+import queue
+import json
+import sys
+import re
+
+#aparte logger voor trage queries, schrijft via een queue zodat de event loop nooit op I/O wacht
+query_logger = logging.getLogger("app.slow_queries")
+query_logger.propagate = False
+
+_listener = None
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|\$\d+|%\(\w+\)s")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Format a log record's `query` payload as one JSON line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = getattr(record, "query", None) or {"message": record.getMessage()}
+        return json.dumps({"ts": round(record.created, 3), "level": record.levelname, **payload}, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> tuple[str, str]:
+    """Return (normalized statement, short hash) with literals and bind parameters replaced by '?'."""
+
+    normalized = _WHITESPACE.sub(" ", _LITERALS.sub("?", statement)).strip()
+    normalized = _IN_LISTS.sub("(?)", normalized)
+    return normalized, hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+def log_query(statement: str, duration: float, rowcount: int):
+    """Log a statement as a JSON line when it is slower than the threshold, or when it is sampled."""
+
+    slow = duration * 1000 >= settings.DB_SLOW_QUERY_MS
+    if not slow and not (settings.DB_QUERY_SAMPLE_RATE and random.random() < settings.DB_QUERY_SAMPLE_RATE):
+        return
+
+    stats = request_stats.get()
+    normalized, digest = fingerprint(statement)
+    query_logger.log(logging.WARNING if slow else logging.INFO, "query", extra={"query": {
+        "event": "slow_query" if slow else "sampled_query",
+        "route": stats.route if stats is not None else None,
+        "duration_ms": round(duration * 1000, 3),
+        "rows": rowcount if rowcount is not None and rowcount >= 0 else None,
+        "fingerprint": digest,
+        "statement": normalized,
+    }})
+
+def start_query_log():
+    """Attach the queue handler and start the listener thread that writes to stdout."""
+
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.Queue(maxsize=settings.DB_QUERY_LOG_QUEUE_SIZE)
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonLineFormatter())
+    query_logger.addHandler(DroppingQueueHandler(log_queue))
+    query_logger.setLevel(logging.INFO)
+    _listener = QueueListener(log_queue, stream)
+    _listener.start()
+
+def stop_query_log():
+    """Flush and stop the listener thread."""
+
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in list(query_logger.handlers):
+        query_logger.removeHandler(handler)
+    _listener = None
@@ -0,0 +1,137 @@
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from sqlalchemy import text
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.metrics import rate_limit_rejections
+import logging
+import math
+import time
+import re
+
+logger = logging.getLogger(__name__)
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_LIMIT_PATTERN = re.compile(r"\s*(\d+)\s*/\s*(second|minute|hour|day)s?\s*", re.IGNORECASE)
+
+
+class RateLimit:
+    """A limit like "10/minute": at most `limit` hits per `period` seconds, bursts up to `limit` allowed."""
+
+    def __init__(self, value: str, setting: str = "rate limit"):
+        match = _LIMIT_PATTERN.fullmatch(value or "")
+        if not match or int(match[1]) < 1:
+            raise ValueError(f"{setting} must look like \"<count>/<{'|'.join(_PERIODS)}>\" with a count of at least 1, not {value!r}")
+        self.limit = int(match[1])
+        self.period = _PERIODS[match[2].lower()]
+        self.interval = self.period / self.limit #tijd tussen twee hits aan constant tempo
+
+    def __repr__(self):
+        return f"RateLimit({self.limit}/{self.period}s)"
+
+
+class MemoryRateLimitStore:
+    """In-process GCRA (token bucket) store, sharded so cleanup only ever walks a small part of the keys."""
+
+    def __init__(self, shards: int = 16, sweep_every: int = 1000):
+        self._shards = [{} for _ in range(shards)]  # key -> theoretical arrival time (tat)
+        self._sweep_every = sweep_every
+        self._hits = 0
+        self._next_sweep = 0
+
+    async def hit(self, key: str, limit: RateLimit) -> float:
+        """Register a hit. Returns 0 when allowed, otherwise the seconds until the next allowed hit."""
+
+        now = time.monotonic()
+        shard = self._shards[hash(key) % len(self._shards)]
+        new_tat = max(shard.get(key, now), now) + limit.interval
+        if new_tat - now > limit.period:
+            return new_tat - now - limit.period
+
+        shard[key] = new_tat
+        self._hits += 1
+        if self._hits % self._sweep_every == 0:
+            self._sweep(now)
+        return 0
+
+    def _sweep(self, now: float):
+        """Drop idle keys from one shard, round robin."""
+
+        shard = self._shards[self._next_sweep]
+        for key in [key for key, tat in shard.items() if tat <= now]:
+            del shard[key]
+        self._next_sweep = (self._next_sweep + 1) % len(self._shards)
+
+
+class PostgresRateLimitStore:
+    """GCRA store in access.rate_limits, shared by all replicas. A hit is one atomic upsert."""
+
+    #de update gebeurt enkel als de hit toegelaten is, anders komt er geen rij terug
+    _HIT = text("""
+        INSERT INTO access.rate_limits AS r (key, tat)
+        VALUES (:key, now() + make_interval(secs => :interval))
+        ON CONFLICT (key) DO UPDATE
+            SET tat = GREATEST(r.tat, now()) + make_interval(secs => :interval)
+            WHERE GREATEST(r.tat, now()) + make_interval(secs => :interval) <= now() + make_interval(secs => :period)
+        RETURNING r.tat
+    """)
+
+    async def hit(self, key: str, limit: RateLimit) -> float:
+        """Register a hit. Returns 0 when allowed, otherwise an estimate of the seconds to wait."""
+
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(self._HIT, {"key": key, "interval": limit.interval, "period": limit.period})
+                allowed = result.first() is not None
+                await session.commit()
+        except Exception:
+            #fail open: een storing in de limiter mag de API niet platleggen
+            logger.exception("Rate limit check failed for %s", key)
+            return 0
+        return 0 if allowed else limit.interval
+
+
+def create_store(backend: str):
+    """Return the rate limit store for the configured backend."""
+
+    if backend.lower() == "postgres":
+        return PostgresRateLimitStore()
+    return MemoryRateLimitStore()
+
+
+store = create_store(settings.RATE_LIMIT_BACKEND)
+
+async def enforce_rate_limit(key: str, limit: RateLimit):
+    """Raise a 429 HTTPException when `key` is over `limit`. Use in route dependencies."""
+
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    retry_after = await store.hit(key, limit)
+    if retry_after:
+        rate_limit_rejections.inc("route")
+        raise HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": str(math.ceil(retry_after))})
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying one limit per client IP to every HTTP request, before routing."""
+
+    def __init__(self, app, limit: str, exempt_paths: tuple = (), setting: str = "RATE_LIMIT_DEFAULT"):
+        self.app = app
+        self.limit = RateLimit(limit, setting)
+        self.exempt_paths = set(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        #client IP is al ingevuld door ProxyHeadersMiddleware
+        client = scope.get("client")
+        retry_after = await store.hit(f"ip:{client[0] if client else 'unknown'}", self.limit)
+        if retry_after:
+            rate_limit_rejections.inc("global")
+            response = JSONResponse({"detail": "Too many requests"}, status_code=429, headers={"Retry-After": str(math.ceil(retry_after))})
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,65 @@
+import hashlib
+import html
+import nh3
+import re
+
+#verhoog dit bij elke wijziging aan de policy hieronder, opgeslagen HTML wordt dan lazy opnieuw gerenderd
+SANITIZER_POLICY_VERSION = 1
+
+ALLOWED_TAGS = {
+    "p", "br", "hr", "span", "div",
+    "strong", "b", "em", "i", "u", "s", "sub", "sup", "mark", "small",
+    "h1", "h2", "h3", "h4", "h5", "h6",
+    "ul", "ol", "li", "blockquote", "pre", "code",
+    "a", "img", "table", "thead", "tbody", "tr", "th", "td",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "th": {"colspan", "rowspan"},
+    "td": {"colspan", "rowspan"},
+}
+ALLOWED_URL_SCHEMES = {"http", "https", "mailto"}
+
+#één keer opgebouwde cleaner, de policy wordt niet bij elke call opnieuw ingelezen
+_cleaner = nh3.Cleaner(
+    tags=ALLOWED_TAGS,
+    clean_content_tags={"script", "style"},
+    attributes=ALLOWED_ATTRIBUTES,
+    url_schemes=ALLOWED_URL_SCHEMES,
+    link_rel="noopener noreferrer nofollow",
+)
+#zonder tags: enkel de tekst blijft over
+_BLOCK_TAG = re.compile(r"<(?=/?(?:p|br|hr|div|h[1-6]|ul|ol|li|blockquote|pre|table|thead|tbody|tr|th|td)\b)")
+_text_cleaner = nh3.Cleaner(tags=set(), clean_content_tags={"script", "style"}, attributes={})
+
+def content_hash(source: str) -> str:
+    """SHA-256 hex digest of the source content."""
+
+    return hashlib.sha256(source.encode()).hexdigest()
+
+def render_content(source: str, mime: str | None = "text/html") -> str:
+    """Sanitize and normalize HTML content. Non-HTML content is escaped and returned as text."""
+
+    if (mime or "text/html") != "text/html":
+        return html.escape(source)
+    return _cleaner.clean(source)
+
+def plain_text(rendered: str) -> str:
+    """Text of sanitized HTML without any tags, for full-text search and snippets."""
+
+    #script/style inhoud is bij het renderen al weg, hier verdwijnen enkel nog de tags zelf
+    #een spatie voor block tags, anders plakken woorden uit twee paragrafen aan elkaar
+    text = _text_cleaner.clean(_BLOCK_TAG.sub(" <", rendered))
+    return " ".join(html.unescape(text).split())
+
+def rendered_fields(source: str, mime: str | None = "text/html") -> dict:
+    """Column values for the cached rendering of `source`, to store on write."""
+
+    rendered = render_content(source, mime)
+    return {
+        "content_rendered": rendered,
+        "content_text": plain_text(rendered),
+        "content_hash": content_hash(source),
+        "render_version": SANITIZER_POLICY_VERSION,
+    }
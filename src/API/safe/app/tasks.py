@@ -0,0 +1,78 @@
+from sqlalchemy import select, delete, func, text, or_
+from app.models import RefreshToken, PasswordReset, RateLimitEntry, OutboxMessage
+from app.config import settings
+from app.database import engine
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+#vaste sleutel voor pg_try_advisory_xact_lock, zodat maar één replica de reaper draait
+REAPER_LOCK_ID = 7_240_001
+
+#resultaat van de laatste reaper pass
+last_reap = {"refresh_tokens": 0, "password_resets": 0, "rate_limits": 0, "outbox": 0, "finished_at": None}
+
+def _reap_statements(batch_size: int):
+    """Build the batched DELETE statements per table, as DELETE ... WHERE id IN (SELECT id ... LIMIT n)."""
+
+    #ingetrokken of ingeruilde refresh tokens blijven staan tot ze verlopen,
+    #ze zijn nodig voor de revocation set en voor reuse detectie
+    expired_tokens = select(RefreshToken.id).where(RefreshToken.expires_at < func.now()).limit(batch_size)
+    finished_resets = select(PasswordReset.id).where(or_(PasswordReset.expires_at < func.now(), PasswordReset.used.is_(True))).limit(batch_size)
+    idle_rate_limits = select(RateLimitEntry.key).where(RateLimitEntry.tat < func.now()).limit(batch_size)
+    #verstuurde en opgegeven mails; ze bevatten reset links, dus niet langer bewaren dan nodig
+    old_outbox = select(OutboxMessage.id).where(
+        OutboxMessage.created_at < func.now() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS),
+        or_(OutboxMessage.sent_at.is_not(None), OutboxMessage.attempts >= settings.OUTBOX_MAX_ATTEMPTS),
+    ).limit(batch_size)
+
+    return {
+        "refresh_tokens": delete(RefreshToken).where(RefreshToken.id.in_(expired_tokens)),
+        "password_resets": delete(PasswordReset).where(PasswordReset.id.in_(finished_resets)),
+        "rate_limits": delete(RateLimitEntry).where(RateLimitEntry.key.in_(idle_rate_limits)),
+        "outbox": delete(OutboxMessage).where(OutboxMessage.id.in_(old_outbox)),
+    }
+
+async def reap_once(batch_size: int) -> dict | None:
+    """Run one reaper pass. Returns the deleted row counts per table, or None if another replica holds the lock."""
+
+    statements = _reap_statements(batch_size)
+    counts = dict.fromkeys(statements, 0)
+    async with engine.connect() as conn:
+        for table, statement in statements.items():
+            #elke batch in een eigen korte transactie, tot er minder dan batch_size rijen weg zijn
+            while True:
+                #transaction-level lock: een session lock overleeft PgBouncer in transaction pooling niet
+                locked = await conn.scalar(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": REAPER_LOCK_ID})
+                if not locked:
+                    await conn.rollback()
+                    #een andere replica is bezig, die ruimt de rest op
+                    return counts if any(counts.values()) else None
+                result = await conn.execute(statement)
+                await conn.commit()
+                counts[table] += result.rowcount
+                if result.rowcount < batch_size:
+                    break
+
+    return counts
+
+async def run_reaper(interval: float, batch_size: int):
+    """Background loop that purges expired tokens and finished password resets every `interval` seconds."""
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            counts = await reap_once(batch_size)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Token reaper pass failed")
+            continue
+
+        if counts is None:
+            logger.debug("Token reaper skipped, lock held by another replica")
+            continue
+        last_reap.update(counts, finished_at=datetime.now(timezone.utc))
+        logger.info("Token reaper removed %d refresh tokens, %d password resets, %d rate limit entries and %d outbox mails", counts["refresh_tokens"], counts["password_resets"], counts["rate_limits"], counts["outbox"])
@@ -0,0 +1,68 @@
+from os import environ, getenv, cpu_count
+import argparse
+import importlib.util
+import os
+
+#launcher: python -m app
+#de settings worden bij de import uit de environment gelezen, daarom zet de launcher eerst de waarden per worker
+#in os.environ en importeert hij app.config pas daarna; de uvicorn workers erven dezelfde environment
+
+def available_cores() -> int:
+    """CPU cores this process may run on (respects CPU affinity, e.g. docker --cpuset-cpus)."""
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return cpu_count() or 1
+
+def split_connections(budget: int, workers: int, pool_size: int, max_overflow: int) -> tuple[int, int]:
+    """Divide a connection budget over the workers, keeping the configured ratio of pool size to overflow. Returns (pool size, overflow) per worker."""
+
+    per_worker = max(1, budget // workers)
+    share = pool_size / max(1, pool_size + max_overflow)
+    worker_pool = max(1, min(per_worker, round(per_worker * share)))
+    return worker_pool, per_worker - worker_pool
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app", description="Run the unsafe API with uvicorn, uvloop and httptools.")
+    parser.add_argument("--host", default=getenv("WEB_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(getenv("WEB_PORT", 80)))
+    parser.add_argument("--workers", type=int, default=int(getenv("WEB_WORKERS") or 0) or None, help="request workers (default: one per core)")
+    args = parser.parse_args()
+
+    #geen password hashing in de unsafe API, alle cores gaan naar request workers
+    cores = available_cores()
+    workers = args.workers or cores
+
+    #DB_MAX_CONNECTIONS is het budget voor de hele instance, standaard wat één worker op zich zou openen
+    pool_size, max_overflow = int(getenv("DB_POOL_SIZE", 10)), int(getenv("DB_MAX_OVERFLOW", 20))
+    budget = int(getenv("DB_MAX_CONNECTIONS", pool_size + max_overflow))
+    worker_pool, worker_overflow = split_connections(budget, workers, pool_size, max_overflow)
+    environ["DB_POOL_SIZE"] = str(worker_pool)
+    environ["DB_MAX_OVERFLOW"] = str(worker_overflow)
+
+    from app.config import settings
+    import uvicorn
+
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+    print("Unsafe API topology:")
+    print(f"  cores: {cores}, request workers: {workers}, event loop: {loop}, http: {http}, listening on {args.host}:{args.port}")
+    print(f"  database: pool {settings.DB_POOL_SIZE} + overflow {settings.DB_MAX_OVERFLOW} per worker, "
+          f"max {workers * (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)} connections (budget {budget})")
+    if budget < workers:
+        print(f"  warning: DB_MAX_CONNECTIONS={budget} is lower than the number of workers, every worker still gets one connection")
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        proxy_headers=False,  #ProxyHeadersMiddleware in app.main doet dit al
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, Request
+from fastapi import FastAPI, Depends, Request, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
@@ -34,11 +34,32 @@ app.add_middleware(
 async def read_root(request: Request):
     return {"message": "Hello, welcome to the Unsafe API! GDC research project by Ian-Chains Baute.", "client_host": request.client.host}
 
+USER_PUBLIC_COLUMNS = (
+    models.User.id,
+    models.User.username,
+    models.User.email,
+    models.User.role,
+    models.User.created_at,
+    models.User.updated_at,
+    models.User.last_login_at,
+)
+
 @app.get("/users")
-async def get_list_all_users(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(models.User))
-    users = result.scalars().all() #scalars() haalt alle kolommen op, all() zet om in lijst
-    return users
+async def get_list_all_users(limit: int = Query(50, ge=1, le=200), after: int | None = Query(None, ge=0), db: AsyncSession = Depends(get_db)):
+    query = select(*USER_PUBLIC_COLUMNS).order_by(models.User.id).limit(limit + 1)
+    if after is not None:
+        query = query.where(models.User.id > after)
+
+    result = await db.execute(query)
+    users = [dict(row) for row in result.mappings()]
+
+    #één extra rij ophalen om te weten of er nog een volgende pagina is
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = users[-1]["id"]
+
+    return {"items": users, "next_cursor": next_cursor}
 
 @app.get("/users/{user_id}")
 async def get_user_by_id(user_id: int, db: AsyncSession = Depends(get_db)):
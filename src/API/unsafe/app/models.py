@@ -1,7 +1,7 @@
 from app.config import Base
 
 from datetime import datetime, timedelta
-from sqlalchemy import (Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index)
+from sqlalchemy import (Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index, func, text)
 
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import INET
@@ -9,14 +9,15 @@ from sqlalchemy.dialects.postgresql import INET
 class User(Base):
     __tablename__ = 'users'
     __table_args__ = (
-        Index('ix_users_username', 'username'),
-        Index('ix_users_email', 'email'),
+        #uniek zonder onderscheid tussen hoofd- en kleine letters, login zoekt op lower(...) met één index seek
+        Index('ix_users_username_lower', func.lower(text('username')), unique=True),
+        Index('ix_users_email_lower', func.lower(text('email')), unique=True),
         {'schema': 'access'}
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    username = Column(String(100), unique=True, nullable=False)
-    email = Column(String(350), unique=True, nullable=False)
+    username = Column(String(100), nullable=False)
+    email = Column(String(350), nullable=False)
     password_hash = Column(Text, nullable=False)
     role = Column(Integer, nullable=False, default=9)
     created_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
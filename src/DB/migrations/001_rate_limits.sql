@@ -0,0 +1,9 @@
+-- Rate limit store voor de safe API (RATE_LIMIT_BACKEND=postgres)
+-- Enkel nodig voor bestaande databases, nieuwe databases krijgen dit via structure-postgres.sql
+
+CREATE TABLE IF NOT EXISTS "access"."rate_limits" (
+  "key" text PRIMARY KEY,
+  "tat" timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS "ix_rate_limits_tat" ON "access"."rate_limits" ("tat");
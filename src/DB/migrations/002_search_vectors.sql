@@ -0,0 +1,15 @@
+-- Full-text search op posts en comments (safe API, GET /search)
+-- Gegenereerde tsvector kolommen, Postgres houdt ze zelf bij bij elke insert/update
+-- Let op: ADD COLUMN ... STORED herschrijft de tabel, voer dit uit buiten de piekuren
+
+ALTER TABLE "content"."posts"
+  ADD COLUMN IF NOT EXISTS "search_vector" tsvector
+  GENERATED ALWAYS AS (setweight(to_tsvector('simple', "title"), 'A') || setweight(to_tsvector('simple', "content"), 'B')) STORED;
+
+ALTER TABLE "content"."comments"
+  ADD COLUMN IF NOT EXISTS "search_vector" tsvector
+  GENERATED ALWAYS AS (to_tsvector('simple', "content")) STORED;
+
+CREATE INDEX IF NOT EXISTS "ix_posts_search_vector" ON "content"."posts" USING GIN ("search_vector");
+
+CREATE INDEX IF NOT EXISTS "ix_comments_search_vector" ON "content"."comments" USING GIN ("search_vector");
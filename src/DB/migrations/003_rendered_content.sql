@@ -0,0 +1,13 @@
+-- Gecachte, gesanitizede HTML voor posts en comments (safe API)
+-- Bestaande rijen blijven NULL en worden lazy gerenderd bij de eerste read (render_version verschilt)
+-- Nullable kolommen zonder default, dus geen tabel rewrite
+
+ALTER TABLE "content"."posts"
+  ADD COLUMN IF NOT EXISTS "content_rendered" text,
+  ADD COLUMN IF NOT EXISTS "content_hash" varchar(64),
+  ADD COLUMN IF NOT EXISTS "render_version" int;
+
+ALTER TABLE "content"."comments"
+  ADD COLUMN IF NOT EXISTS "content_rendered" text,
+  ADD COLUMN IF NOT EXISTS "content_hash" varchar(64),
+  ADD COLUMN IF NOT EXISTS "render_version" int;
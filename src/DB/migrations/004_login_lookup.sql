@@ -0,0 +1,35 @@
+-- Login zoekt op lower(username) of lower(email), met één index seek
+-- Vervangt de unique constraints en de dubbele btree indexes op username en email door twee unieke functionele indexes
+-- CONCURRENTLY kan niet in een transactie, voer dit bestand uit zonder BEGIN/COMMIT (psql zonder --single-transaction)
+
+-- stop als er users zijn die alleen in hoofdletters verschillen, die moeten eerst handmatig samengevoegd worden
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM "access"."users" GROUP BY lower("username") HAVING count(*) > 1) THEN
+    RAISE EXCEPTION 'access.users has usernames that differ only in case';
+  END IF;
+  IF EXISTS (SELECT 1 FROM "access"."users" GROUP BY lower("email") HAVING count(*) > 1) THEN
+    RAISE EXCEPTION 'access.users has emails that differ only in case';
+  END IF;
+  -- usernames met '@' loggen in via een tweede lookup op username wanneer geen email overeenkomt, nieuwe usernames mogen geen '@' meer bevatten
+  IF EXISTS (SELECT 1 FROM "access"."users" WHERE "username" LIKE '%@%') THEN
+    RAISE NOTICE 'access.users has usernames containing @, these log in through the username fallback';
+  END IF;
+END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "ix_users_username_lower" ON "access"."users" (lower("username"));
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "ix_users_email_lower" ON "access"."users" (lower("email"));
+
+-- de oude constraints en indexes zijn nu overbodig, ze kosten alleen schrijfwerk
+ALTER TABLE "access"."users" DROP CONSTRAINT IF EXISTS "users_username_key";
+
+ALTER TABLE "access"."users" DROP CONSTRAINT IF EXISTS "users_email_key";
+
+DROP INDEX CONCURRENTLY IF EXISTS "access"."users_username_idx";
+
+DROP INDEX CONCURRENTLY IF EXISTS "access"."users_email_idx";
+
+DROP INDEX CONCURRENTLY IF EXISTS "access"."ix_users_username";
+
+DROP INDEX CONCURRENTLY IF EXISTS "access"."ix_users_email";
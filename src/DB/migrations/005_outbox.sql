@@ -0,0 +1,20 @@
+-- Outbox voor uitgaande mails van de safe API (password resets)
+-- De API schrijft een bericht in dezelfde transactie als de reset, een worker verstuurt ze in batches met FOR UPDATE SKIP LOCKED
+
+CREATE TABLE IF NOT EXISTS "access"."outbox" (
+  "id" INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  "kind" varchar(50) NOT NULL,
+  "recipient" varchar(350) NOT NULL,
+  "subject" text NOT NULL,
+  "body" text NOT NULL,
+  "created_at" timestamptz NOT NULL DEFAULT (now()),
+  "available_at" timestamptz NOT NULL DEFAULT (now()),
+  "attempts" int NOT NULL DEFAULT 0,
+  "sent_at" timestamptz,
+  "last_error" text
+);
+
+-- enkel onverzonden berichten, klein zolang de worker bijhoudt
+CREATE INDEX IF NOT EXISTS "ix_outbox_pending" ON "access"."outbox" ("available_at") WHERE "sent_at" IS NULL;
+
+CREATE INDEX IF NOT EXISTS "ix_outbox_created_at" ON "access"."outbox" ("created_at");
@@ -0,0 +1,9 @@
+-- Tijdstip van intrekken per refresh token
+-- De API haalt de revocation set incrementeel op: enkel de rijen die sinds de vorige keer ingetrokken zijn
+
+ALTER TABLE "access"."refresh_tokens" ADD COLUMN IF NOT EXISTS "revoked_at" timestamptz;
+
+-- bestaande ingetrokken tokens: het laatste tijdstip dat we kennen
+UPDATE "access"."refresh_tokens" SET "revoked_at" = COALESCE("last_used_at", "created_at") WHERE "revoked" AND "revoked_at" IS NULL;
+
+CREATE INDEX IF NOT EXISTS "ix_refresh_tokens_revoked_at" ON "access"."refresh_tokens" ("revoked_at") WHERE "revoked_at" IS NOT NULL;
@@ -0,0 +1,4 @@
+-- De index op rate_limits.tat heette rate_limits_tat_idx in 001 en in structure-postgres.sql, het model noemt hem ix_rate_limits_tat
+-- Voor databases die 001 al uitvoerden of van structure-postgres.sql vertrokken
+
+ALTER INDEX IF EXISTS "access"."rate_limits_tat_idx" RENAME TO "ix_rate_limits_tat";
@@ -0,0 +1,35 @@
+-- Full-text search op gesanitizede platte tekst in plaats van op de ruwe HTML (safe API, GET /search)
+-- content_text wordt bij het schrijven door de API gevuld (tekst van content_rendered, zonder tags)
+-- Let op: de search_vector kolommen worden opnieuw gegenereerd, dat herschrijft de tabellen; voer dit uit buiten de piekuren
+
+ALTER TABLE "content"."posts" ADD COLUMN IF NOT EXISTS "content_text" text;
+ALTER TABLE "content"."comments" ADD COLUMN IF NOT EXISTS "content_text" text;
+
+-- voorlopige tekst voor bestaande rijen: script/style blokken en tags weg
+-- render_version NULL zorgt dat de API ze bij de eerstvolgende read exact opnieuw rendert en content_text overschrijft
+UPDATE "content"."posts"
+SET "content_text" = regexp_replace(regexp_replace("content", '<(script|style)\y.*?</\1\s*>', ' ', 'gi'), '<[^>]*>', ' ', 'g'),
+    "render_version" = NULL
+WHERE "content_text" IS NULL;
+
+UPDATE "content"."comments"
+SET "content_text" = regexp_replace(regexp_replace("content", '<(script|style)\y.*?</\1\s*>', ' ', 'gi'), '<[^>]*>', ' ', 'g'),
+    "render_version" = NULL
+WHERE "content_text" IS NULL;
+
+-- een generated expressie wijzigen kan niet in place (Postgres < 17): kolom en index opnieuw aanmaken
+DROP INDEX IF EXISTS "content"."ix_posts_search_vector";
+ALTER TABLE "content"."posts" DROP COLUMN IF EXISTS "search_vector";
+ALTER TABLE "content"."posts"
+  ADD COLUMN "search_vector" tsvector
+  GENERATED ALWAYS AS (setweight(to_tsvector('simple', "title"), 'A') || setweight(to_tsvector('simple', coalesce("content_text", '')), 'B')) STORED;
+
+DROP INDEX IF EXISTS "content"."ix_comments_search_vector";
+ALTER TABLE "content"."comments" DROP COLUMN IF EXISTS "search_vector";
+ALTER TABLE "content"."comments"
+  ADD COLUMN "search_vector" tsvector
+  GENERATED ALWAYS AS (to_tsvector('simple', coalesce("content_text", ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS "ix_posts_search_vector" ON "content"."posts" USING GIN ("search_vector");
+
+CREATE INDEX IF NOT EXISTS "ix_comments_search_vector" ON "content"."comments" USING GIN ("search_vector");
@@ -4,8 +4,8 @@ CREATE SCHEMA "content";
 
 CREATE TABLE "access"."users" (
   "id" INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
-  "username" varchar(100) UNIQUE NOT NULL,
-  "email" varchar(350) UNIQUE NOT NULL,
+  "username" varchar(100) NOT NULL,
+  "email" varchar(350) NOT NULL,
   "password_hash" text NOT NULL,
   "role" int NOT NULL DEFAULT 9,
   "created_at" timestamptz NOT NULL DEFAULT (now()),
@@ -21,6 +21,7 @@ CREATE TABLE "access"."refresh_tokens" (
   "created_at" timestamptz NOT NULL DEFAULT (now()),
   "expires_at" timestamptz NOT NULL DEFAULT (CURRENT_TIMESTAMP + INTERVAL '3 days'),
   "revoked" boolean NOT NULL DEFAULT false,
+  "revoked_at" timestamptz,
   "ip" inet,
   "user_agent" text,
   "last_used_at" timestamptz
@@ -38,6 +39,24 @@ CREATE TABLE "access"."password_resets" (
   "user_agent" text
 );
 
+CREATE TABLE "access"."rate_limits" (
+  "key" text PRIMARY KEY,
+  "tat" timestamptz NOT NULL
+);
+
+CREATE TABLE "access"."outbox" (
+  "id" INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+  "kind" varchar(50) NOT NULL,
+  "recipient" varchar(350) NOT NULL,
+  "subject" text NOT NULL,
+  "body" text NOT NULL,
+  "created_at" timestamptz NOT NULL DEFAULT (now()),
+  "available_at" timestamptz NOT NULL DEFAULT (now()),
+  "attempts" int NOT NULL DEFAULT 0,
+  "sent_at" timestamptz,
+  "last_error" text
+);
+
 CREATE TABLE "content"."posts" (
   "id" INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
   "author_id" int NOT NULL,
@@ -45,7 +64,12 @@ CREATE TABLE "content"."posts" (
   "content" text NOT NULL,
   "content_mime" varchar(50) DEFAULT 'text/html',
   "created_at" timestamptz NOT NULL DEFAULT (now()),
-  "updated_at" timestamptz NOT NULL DEFAULT (now())
+  "updated_at" timestamptz NOT NULL DEFAULT (now()),
+  "search_vector" tsvector GENERATED ALWAYS AS (setweight(to_tsvector('simple', "title"), 'A') || setweight(to_tsvector('simple', coalesce("content_text", '')), 'B')) STORED,
+  "content_rendered" text,
+  "content_text" text,
+  "content_hash" varchar(64),
+  "render_version" int
 );
 
 CREATE TABLE "content"."comments" (
@@ -54,12 +78,17 @@ CREATE TABLE "content"."comments" (
   "author_id" int NOT NULL,
   "content" text NOT NULL,
   "created_at" timestamptz NOT NULL DEFAULT (now()),
-  "updated_at" timestamptz NOT NULL DEFAULT (now())
+  "updated_at" timestamptz NOT NULL DEFAULT (now()),
+  "search_vector" tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce("content_text", ''))) STORED,
+  "content_rendered" text,
+  "content_text" text,
+  "content_hash" varchar(64),
+  "render_version" int
 );
 
-CREATE INDEX ON "access"."users" ("username");
+CREATE UNIQUE INDEX "ix_users_username_lower" ON "access"."users" (lower("username"));
 
-CREATE INDEX ON "access"."users" ("email");
+CREATE UNIQUE INDEX "ix_users_email_lower" ON "access"."users" (lower("email"));
 
 CREATE INDEX ON "access"."refresh_tokens" ("user_id", "created_at");
 
@@ -67,12 +96,20 @@ CREATE INDEX ON "access"."refresh_tokens" ("token");
 
 CREATE INDEX ON "access"."refresh_tokens" ("expires_at");
 
+CREATE INDEX "ix_refresh_tokens_revoked_at" ON "access"."refresh_tokens" ("revoked_at") WHERE "revoked_at" IS NOT NULL;
+
 CREATE INDEX ON "access"."password_resets" ("user_id", "created_at");
 
 CREATE INDEX ON "access"."password_resets" ("reset_token");
 
 CREATE INDEX ON "access"."password_resets" ("expires_at");
 
+CREATE INDEX "ix_rate_limits_tat" ON "access"."rate_limits" ("tat");
+
+CREATE INDEX "ix_outbox_pending" ON "access"."outbox" ("available_at") WHERE "sent_at" IS NULL;
+
+CREATE INDEX "ix_outbox_created_at" ON "access"."outbox" ("created_at");
+
 CREATE INDEX ON "content"."posts" ("author_id");
 
 CREATE INDEX ON "content"."posts" ("created_at");
@@ -81,6 +118,10 @@ CREATE INDEX ON "content"."comments" ("post_id", "created_at");
 
 CREATE INDEX ON "content"."comments" ("author_id", "created_at");
 
+CREATE INDEX ON "content"."posts" USING GIN ("search_vector");
+
+CREATE INDEX ON "content"."comments" USING GIN ("search_vector");
+
 ALTER TABLE "content"."posts" ADD FOREIGN KEY ("author_id") REFERENCES "access"."users" ("id");
 
 ALTER TABLE "content"."comments" ADD FOREIGN KEY ("post_id") REFERENCES "content"."posts" ("id");
@@ -0,0 +1,296 @@
+"""Load test: throughput and latency of the safe or unsafe API at a fixed concurrency.
+
+Starts the chosen API with uvicorn (or uses --url), seeds load_* users, posts
+and comments in the local Postgres, then drives each scenario for a fixed
+time at a fixed number of concurrent clients. Prints one JSON document with
+RPS and p50/p95/p99 latency per scenario plus the run settings and git
+commit, so runs can be compared across commits and between the two APIs.
+
+    python load.py --api safe
+    python load.py --api unsafe --concurrency 64 --duration 30
+    python load.py --api safe --scenarios login create_user --output safe.json
+    python load.py --url http://localhost:8000 --api safe
+    python load.py --cleanup
+
+Scenarios an API does not have (the unsafe API has no POST /users or /login)
+are reported as unsupported. The rate limiter of the safe API is disabled for
+the started server, otherwise it measures 429s. The client runs in this
+process: give the server and the client their own cores, and compare runs
+made on the same machine only.
+"""
+from os import getenv, cpu_count
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import asyncpg
+import httpx
+from argon2 import PasswordHasher
+
+API_DIR = Path(__file__).resolve().parents[3] / "src" / "API"
+PREFIX = "load_"
+PASSWORD = "load-password-123"
+
+#scenario -> (method, path in de openapi spec)
+SCENARIOS = {
+    "root": ("GET", "/"),
+    "users_list": ("GET", "/users"),
+    "user_by_id": ("GET", "/users/{user_id}"),
+    "create_user": ("POST", "/users"),
+    "login": ("POST", "/login"),
+}
+
+def dsn_from_env() -> str:
+    """Build a DSN from the same DB_* variables the API uses."""
+
+    return "postgresql://{}:{}@{}:{}/{}".format(
+        getenv("DB_USER", "user"), getenv("DB_PASS", "password"),
+        getenv("DB_HOST", "localhost"), getenv("DB_PORT", "5432"), getenv("DB_NAME", "database"),
+    )
+
+def password_hash() -> str:
+    """Argon2 hash of PASSWORD with the same HASH_* settings as the safe API, so /login costs what it costs in production."""
+
+    return PasswordHasher(
+        time_cost=int(getenv("HASH_TIME_COST", 3)),
+        memory_cost=int(getenv("HASH_MEMORY_COST", 65536)),
+        parallelism=int(getenv("HASH_PARALLELISM", 4)),
+        salt_len=int(getenv("HASH_SALT_LENGTH", 16)),
+        hash_len=int(getenv("HASH_HASH_LENGTH", 32)),
+    ).hash(PASSWORD)
+
+async def seed(conn, users: int, posts: int, comments: int) -> list[int]:
+    """Top up the load_* users, and the posts and comments they wrote, to the requested counts. Returns the user ids."""
+
+    existing = await conn.fetchval("SELECT count(*) FROM access.users WHERE username LIKE $1 || 'seed%'", PREFIX)
+    if existing < users:
+        #één hash voor alle users, verify kost per user evenveel
+        await conn.execute("""
+            INSERT INTO access.users (username, email, password_hash, role, created_at, updated_at)
+            SELECT $1 || 'seed' || g, $1 || 'seed' || g || '@example.com', $2, 9, now(), now()
+            FROM generate_series($3::int, $4::int) g
+            ON CONFLICT DO NOTHING
+        """, PREFIX, password_hash(), existing + 1, users)
+
+    user_ids = [row["id"] for row in await conn.fetch(
+        "SELECT id FROM access.users WHERE username LIKE $1 || 'seed%' ORDER BY id LIMIT $2", PREFIX, users)]
+
+    existing = await conn.fetchval("SELECT count(*) FROM content.posts WHERE author_id = ANY($1::int[])", user_ids)
+    if existing < posts:
+        await conn.execute("""
+            INSERT INTO content.posts (author_id, title, content)
+            SELECT ($1::int[])[1 + g % array_length($1::int[], 1)], 'load post ' || g, '<p>load post body ' || g || '</p>'
+            FROM generate_series($2::int, $3::int) g
+        """, user_ids, existing + 1, posts)
+
+    post_ids = [row["id"] for row in await conn.fetch(
+        "SELECT id FROM content.posts WHERE author_id = ANY($1::int[]) ORDER BY id LIMIT $2", user_ids, posts)]
+    existing = await conn.fetchval("SELECT count(*) FROM content.comments WHERE author_id = ANY($1::int[])", user_ids)
+    if post_ids and existing < comments:
+        await conn.execute("""
+            INSERT INTO content.comments (post_id, author_id, content)
+            SELECT ($1::int[])[1 + g % array_length($1::int[], 1)], ($2::int[])[1 + g % array_length($2::int[], 1)], 'load comment ' || g
+            FROM generate_series($3::int, $4::int) g
+        """, post_ids, user_ids, existing + 1, comments)
+
+    await conn.execute("ANALYZE access.users")
+    await conn.execute("ANALYZE content.posts")
+    await conn.execute("ANALYZE content.comments")
+    return user_ids
+
+async def cleanup(conn) -> dict:
+    """Delete everything the load test created: load_* users with their sessions, posts and comments."""
+
+    user_ids = [row["id"] for row in await conn.fetch("SELECT id FROM access.users WHERE username LIKE $1 || '%'", PREFIX)]
+    counts = {"users": len(user_ids)}
+    async with conn.transaction():
+        counts["comments"] = int((await conn.execute(
+            "DELETE FROM content.comments WHERE author_id = ANY($1::int[]) OR post_id IN (SELECT id FROM content.posts WHERE author_id = ANY($1::int[]))", user_ids)).split()[-1])
+        counts["posts"] = int((await conn.execute("DELETE FROM content.posts WHERE author_id = ANY($1::int[])", user_ids)).split()[-1])
+        await conn.execute("DELETE FROM access.refresh_tokens WHERE user_id = ANY($1::int[])", user_ids)
+        await conn.execute("DELETE FROM access.password_resets WHERE user_id = ANY($1::int[])", user_ids)
+        await conn.execute("DELETE FROM access.users WHERE id = ANY($1::int[])", user_ids)
+    return counts
+
+def start_server(api: str, port: int, workers: int) -> subprocess.Popen:
+    """Start the API with uvicorn in a subprocess, with the rate limiter and query sampling off."""
+
+    env = {**os.environ, "RATE_LIMIT_ENABLED": "false", "DB_QUERY_SAMPLE_RATE": "0", "DB_ECHO_QUERIES": "false"}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=API_DIR / api, env=env,
+    )
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 30):
+    """Poll GET / until the server answers."""
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("API did not start in time")
+        await asyncio.sleep(0.2)
+
+def make_request(name: str, rng: random.Random, user_ids: list[int], run_id: str, counter: list[int]) -> dict:
+    """Arguments for one request of a scenario."""
+
+    if name == "root":
+        return {"method": "GET", "url": "/"}
+    if name == "users_list":
+        return {"method": "GET", "url": "/users", "params": {"limit": 50, "after": rng.choice(user_ids) - 1}}
+    if name == "user_by_id":
+        return {"method": "GET", "url": f"/users/{rng.choice(user_ids)}"}
+    if name == "create_user":
+        counter[0] += 1
+        username = f"{PREFIX}new_{run_id}_{counter[0]}"
+        return {"method": "POST", "url": "/users", "json": {"username": username, "email": f"{username}@example.com", "password": PASSWORD}}
+    if name == "login":
+        return {"method": "POST", "url": "/login", "json": {"username_or_email": f"{PREFIX}seed{rng.randint(1, len(user_ids))}", "password": PASSWORD}}
+    raise ValueError(name)
+
+async def run_scenario(client: httpx.AsyncClient, name: str, concurrency: int, duration: float, warmup: float, user_ids: list[int], seed: int) -> dict:
+    """Drive one scenario with `concurrency` clients for `warmup` + `duration` seconds. Only the measured part counts."""
+
+    rng = random.Random(seed)
+    run_id = f"{seed}_{int(time.time())}"
+    counter = [0]
+    latencies, statuses = [], {}
+    last_done = [0.0]
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    async def worker():
+        while True:
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                return
+            request = make_request(name, rng, user_ids, run_id, counter)
+            try:
+                response = await client.request(**request)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            done = time.perf_counter()
+            if sent >= measure_from:
+                last_done[0] = max(last_done[0], done)
+                latencies.append(done - sent)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    #van het begin van de meting tot de laatste gemeten response
+    elapsed = last_done[0] - measure_from
+
+    ok = sum(count for status, count in statuses.items() if isinstance(status, int) and 200 <= status < 300)
+    result = {
+        "requests": len(latencies),
+        "ok": ok,
+        "errors": len(latencies) - ok,
+        "status": {str(status): count for status, count in sorted(statuses.items(), key=lambda item: str(item[0]))},
+        "rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0,
+    }
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        result.update({
+            "p50_ms": round(percentiles[49] * 1000, 2),
+            "p95_ms": round(percentiles[94] * 1000, 2),
+            "p99_ms": round(percentiles[98] * 1000, 2),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+        })
+    return result
+
+def git_commit() -> str | None:
+    """Current git commit of the repository, marked -dirty when there are local changes."""
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=API_DIR, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", choices=("safe", "unsafe"), default="safe")
+    parser.add_argument("--url", help="use an already running API instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the started server")
+    parser.add_argument("--dsn", default=dsn_from_env())
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--posts", type=int, default=10_000)
+    parser.add_argument("--comments", type=int, default=50_000)
+    parser.add_argument("--scenarios", nargs="+", choices=tuple(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds before each scenario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    parser.add_argument("--cleanup", action="store_true", help="delete all load_* data, then exit")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        if args.cleanup:
+            print(json.dumps({"cleanup": await cleanup(conn)}))
+            return
+        seed_start = time.perf_counter()
+        user_ids = await seed(conn, args.users, args.posts, args.comments)
+        seed_seconds = time.perf_counter() - seed_start
+    finally:
+        await conn.close()
+
+    server = None if args.url else start_server(args.api, args.port, args.workers)
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            await wait_until_up(client)
+            spec = (await client.get("/openapi.json")).json()
+
+            results = {}
+            for name in args.scenarios:
+                method, path = SCENARIOS[name]
+                if method.lower() not in spec.get("paths", {}).get(path, {}):
+                    results[name] = {"unsupported": True}
+                    continue
+                results[name] = await run_scenario(client, name, args.concurrency, args.duration, args.warmup, user_ids, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    report = {
+        "api": args.api,
+        "commit": git_commit(),
+        "url": base_url,
+        "python": platform.python_version(),
+        "cpu_count": cpu_count(),
+        "server_workers": None if args.url else args.workers,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "seed": args.seed,
+        "seeded": {"users": len(user_ids), "posts": args.posts, "comments": args.comments, "seconds": round(seed_seconds, 1)},
+        "hash": {name: getenv(name) for name in ("HASH_TIME_COST", "HASH_MEMORY_COST", "HASH_PARALLELISM", "HASH_WORKERS") if getenv(name)},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+if __name__ == "__main__":
+    asyncio.run(main())
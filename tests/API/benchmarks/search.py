@@ -0,0 +1,165 @@
+"""Benchmark: full-text search (tsvector + GIN) vs. naive ILIKE on content.posts.
+
+Seeds N synthetic posts in a local Postgres that already has the structure and
+migrations 002_search_vectors.sql and 008_search_text.sql applied, then times
+both query styles for a set of rare, common and multi-word terms. Prints the
+results as JSON.
+
+    python search.py --rows 100000
+    python search.py --rows 1000000 --repeat 20
+    python search.py --cleanup
+
+Use a dedicated database: the seeded rows are only removed with --cleanup.
+"""
+from os import getenv
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import asyncpg
+
+BENCH_USER = "bench_search"
+TITLE_PREFIX = "bench:"
+
+ILIKE_QUERY = """
+    SELECT id FROM content.posts
+    WHERE title ILIKE $1 OR content ILIKE $1
+    ORDER BY created_at DESC
+    LIMIT 20
+"""
+FTS_QUERY = """
+    SELECT id, ts_rank_cd(search_vector, q) AS rank
+    FROM content.posts, websearch_to_tsquery('simple', $1) q
+    WHERE search_vector @@ q
+    ORDER BY rank DESC, id DESC
+    LIMIT 20
+"""
+
+def dsn_from_env() -> str:
+    """Build a DSN from the same DB_* variables the API uses."""
+
+    return "postgresql://{}:{}@{}:{}/{}".format(
+        getenv("DB_USER", "user"), getenv("DB_PASS", "password"),
+        getenv("DB_HOST", "localhost"), getenv("DB_PORT", "5432"), getenv("DB_NAME", "database"),
+    )
+
+def make_vocabulary(size: int, seed: int) -> list[str]:
+    """Pseudo-words built from syllables, so the text looks like natural language to the parser."""
+
+    rng = random.Random(seed)
+    syllables = ["ba", "ke", "lo", "mi", "nu", "ra", "se", "ti", "vo", "za", "der", "ing", "ver", "ont", "aal"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+async def seed(conn, rows: int, vocabulary: list[str], batch: int):
+    """Insert synthetic posts until there are `rows` bench posts. Returns the number inserted."""
+
+    author_id = await conn.fetchval("SELECT id FROM access.users WHERE username = $1", BENCH_USER)
+    if author_id is None:
+        author_id = await conn.fetchval(
+            "INSERT INTO access.users (username, email, password_hash) VALUES ($1, $2, 'x') RETURNING id",
+            BENCH_USER, f"{BENCH_USER}@example.invalid",
+        )
+
+    existing = await conn.fetchval("SELECT count(*) FROM content.posts WHERE author_id = $1", author_id)
+    inserted = 0
+    #content = 6 willekeurige zinnen uit een vaste pool, samengesteld in SQL
+    #zodat er geen miljoenen rijen over de lijn moeten
+    rng = random.Random(len(vocabulary))
+    sentences = [" ".join(rng.choice(vocabulary) for _ in range(10)) for _ in range(2000)]
+    pick = "($3::text[])[1 + floor(random() * 2000)::int]"
+    statement = f"""
+        INSERT INTO content.posts (author_id, title, content, content_text)
+        SELECT $1, $2 || g::text, body, body
+        FROM (SELECT g, concat_ws(' ', {", ".join([pick] * 6)}) AS body FROM generate_series($4::int, $5::int) g) s
+    """
+    while existing + inserted < rows:
+        start = existing + inserted + 1
+        end = min(rows, start + batch - 1)
+        await conn.execute(statement, author_id, TITLE_PREFIX, sentences, start, end)
+        inserted += end - start + 1
+        print(f"seeded {existing + inserted}/{rows}", flush=True)
+
+    await conn.execute("ANALYZE content.posts")
+    return inserted
+
+async def time_query(conn, sql: str, arg: str, repeat: int) -> dict:
+    """Run a query `repeat` times (after one warm-up) and summarize the latency in ms."""
+
+    await conn.fetch(sql, arg)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await conn.fetch(sql, arg)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+
+    plan = await conn.fetchval("EXPLAIN (FORMAT JSON) " + sql, arg)
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    nodes, stack = [], [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        nodes.append(node["Node Type"])
+        stack.extend(node.get("Plans", []))
+
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[max(0, int(len(timings) * 0.95) - 1)], 3),
+        "max_ms": round(timings[-1], 3),
+        "scan_nodes": sorted({n for n in nodes if "Scan" in n}),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=dsn_from_env())
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=50_000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cleanup", action="store_true", help="delete the bench posts and user, then exit")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        if args.cleanup:
+            await conn.execute("DELETE FROM content.posts WHERE author_id = (SELECT id FROM access.users WHERE username = $1)", BENCH_USER)
+            await conn.execute("DELETE FROM access.users WHERE username = $1", BENCH_USER)
+            print(json.dumps({"cleanup": "done"}))
+            return
+
+        vocabulary = make_vocabulary(args.vocabulary, args.seed)
+        seed_start = time.perf_counter()
+        inserted = await seed(conn, args.rows, vocabulary, args.batch)
+        seed_seconds = time.perf_counter() - seed_start
+
+        #zeldzaam woord, veelvoorkomend woord en een combinatie van twee woorden
+        rng = random.Random(args.seed)
+        terms = {"rare": rng.choice(vocabulary), "common": vocabulary[0], "two_words": " ".join(rng.sample(vocabulary, 2))}
+
+        results = {}
+        for name, term in terms.items():
+            results[name] = {
+                "term": term,
+                "ilike": await time_query(conn, ILIKE_QUERY, f"%{term.split()[0]}%", args.repeat),
+                "fts": await time_query(conn, FTS_QUERY, term, args.repeat),
+            }
+
+        total = await conn.fetchval("SELECT count(*) FROM content.posts")
+        print(json.dumps({
+            "rows_in_table": total,
+            "rows_seeded_now": inserted,
+            "seed_seconds": round(seed_seconds, 1),
+            "repeat": args.repeat,
+            "results": results,
+        }, indent=2))
+    finally:
+        await conn.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
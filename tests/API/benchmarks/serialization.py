@@ -0,0 +1,100 @@
+"""Benchmark: JSON serialization cost of a page of users, per 1,000 users.
+
+Compares the paths a list endpoint of the safe API can take:
+
+- jsonable_encoder on ORM objects + json.dumps (the old GET /users)
+- jsonable_encoder on column dicts + json.dumps (no response model)
+- response model + orjson (ORJSONResponse as default_response_class)
+- response model + Pydantic dump_json (what FastAPI does with a response
+  model and the default response class, used by the API)
+
+Needs no database, but imports the API package for its models:
+
+    python serialization.py
+    python serialization.py --users 5000 --repeat 50
+"""
+from pathlib import Path
+import argparse
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "src" / "API" / "safe"))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.main import UserPage
+import app.models as models
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def make_rows(count: int) -> list[dict]:
+    """Synthetic users with the same keys as USER_PUBLIC_COLUMNS."""
+
+    now = datetime.now(timezone.utc)
+    return [{
+        "id": i,
+        "username": f"user{i}",
+        "email": f"user{i}@example.com",
+        "role": 9,
+        "created_at": now - timedelta(days=i),
+        "updated_at": now - timedelta(hours=i),
+        "last_login_at": now if i % 3 else None,
+    } for i in range(1, count + 1)]
+
+def make_orm_users(rows: list[dict]) -> list:
+    """The same users as transient ORM objects, including password_hash like the old endpoint loaded them."""
+
+    return [models.User(**row, password_hash="$argon2id$v=19$m=65536,t=3,p=4$" + "x" * 64) for row in rows]
+
+def measure(func, repeat: int) -> list[float]:
+    """Run func `repeat` times after one warm-up run. Returns the durations in ms."""
+
+    func()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    rows = make_rows(args.users)
+    orm_users = make_orm_users(rows)
+    page = {"items": rows, "next_cursor": args.users}
+    adapter = TypeAdapter(UserPage)
+
+    #zelfde stappen als FastAPI: valideren tegen het response model, dan serialiseren
+    paths = {
+        "jsonable_encoder_orm": lambda: json.dumps(jsonable_encoder(orm_users)).encode(),
+        "jsonable_encoder_dicts": lambda: json.dumps(jsonable_encoder(page)).encode(),
+        "response_model_dump_json": lambda: adapter.dump_json(adapter.validate_python(page)),
+    }
+    if orjson is not None:
+        paths["response_model_orjson"] = lambda: orjson.dumps(adapter.dump_python(adapter.validate_python(page), mode="json"))
+
+    scale = 1000 / args.users
+    results = {}
+    for name, func in paths.items():
+        durations = measure(func, args.repeat)
+        results[name] = {
+            "ms_per_1000_users_p50": round(statistics.median(durations) * scale, 3),
+            "ms_per_1000_users_min": round(min(durations) * scale, 3),
+            "bytes": len(func()),
+        }
+
+    print(json.dumps({"users": args.users, "repeat": args.repeat, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Shared fixtures for the safe API tests.
+
+The tests import the `app` package of src/API/safe directly. Tests that need
+PostgreSQL use the `database` fixture and are skipped when the database from
+the DB_* environment variables is not reachable.
+"""
+from pathlib import Path
+from types import SimpleNamespace
+import asyncio
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "src" / "API" / "safe"))
+
+
+class FakeClock:
+    """Stand-in for time.monotonic/time.time that only moves when told to.
+
+    Patch it in as the module's `time` (see `fake_time`), never on the time module itself: asyncio's event loop uses time.monotonic too.
+    """
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def fake_time(clock: FakeClock) -> SimpleNamespace:
+    """Replacement for a module's `time` import, backed by `clock`."""
+
+    return SimpleNamespace(monotonic=clock, time=clock, perf_counter=clock)
+
+
+async def _can_connect() -> bool:
+    import asyncpg
+    from app.config import settings
+
+    try:
+        conn = await asyncio.wait_for(asyncpg.connect(
+            host=settings.DB_HOST, port=settings.DB_PORT, user=settings.DB_USER,
+            password=settings.DB_PASS, database=settings.DB_NAME,
+        ), 3)
+    except Exception:
+        return False
+    await conn.close()
+    return True
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Skip the test when PostgreSQL is not available."""
+
+    if not asyncio.run(_can_connect()):
+        pytest.skip("PostgreSQL from the DB_* settings is not reachable")
+
+
+def run_with_engine(coro_factory):
+    """Run an async test body that uses app.database, and dispose the engine on the same event loop."""
+
+    from app.database import engine
+
+    async def main():
+        try:
+            return await coro_factory()
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
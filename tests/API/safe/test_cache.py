@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from conftest import fake_time
+import app.cache as cache
+from app.cache import AsyncTTLCache
+
+
+@pytest.fixture
+def ttl_cache(clock, monkeypatch):
+    monkeypatch.setattr(cache, "time", fake_time(clock))
+    return AsyncTTLCache(maxsize=3, ttl=10)
+
+def test_entries_expire_after_ttl(ttl_cache, clock):
+    ttl_cache.set("a", 1)
+    assert ttl_cache.get("a") == 1
+    clock.advance(10)
+    assert ttl_cache.get("a") is None
+    assert ttl_cache.stats()["size"] == 0
+
+def test_shorter_ttl_per_entry_but_never_longer_than_default(ttl_cache, clock):
+    ttl_cache.set("short", 1, ttl=2)
+    ttl_cache.set("long", 2, ttl=60)
+    clock.advance(3)
+    assert ttl_cache.get("short") is None
+    assert ttl_cache.get("long") == 2
+    clock.advance(7)
+    assert ttl_cache.get("long") is None
+
+def test_evicts_least_recently_used_above_maxsize(ttl_cache):
+    for key in "abc":
+        ttl_cache.set(key, key)
+    ttl_cache.get("a")  # a is nu het meest recent gebruikt
+    ttl_cache.set("d", "d")
+    assert ttl_cache.get("b") is None
+    assert [ttl_cache.get(key) for key in "acd"] == ["a", "c", "d"]
+
+def test_counts_hits_misses_and_loads(ttl_cache):
+    async def loader(key):
+        return key * 2
+
+    async def body():
+        await ttl_cache.get_or_load(1, loader)
+        await ttl_cache.get_or_load(1, loader)
+
+    asyncio.run(body())
+    assert ttl_cache.stats() == {"hits": 1, "misses": 1, "loads": 1, "size": 1, "maxsize": 3}
+
+def test_concurrent_misses_share_one_load(ttl_cache):
+    calls = []
+
+    async def loader(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return f"user {key}"
+
+    async def body():
+        return await asyncio.gather(*(ttl_cache.get_or_load(7, loader) for _ in range(10)))
+
+    assert asyncio.run(body()) == ["user 7"] * 10
+    assert calls == [7]
+
+def test_failed_load_reaches_all_waiters_and_is_not_cached(ttl_cache):
+    calls = []
+
+    async def loader(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+
+    async def body():
+        return await asyncio.gather(*(ttl_cache.get_or_load(1, loader) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(body())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert calls == [1]
+    assert ttl_cache.stats()["size"] == 0
+
+def test_invalidate_during_load_does_not_store_stale_value(ttl_cache):
+    async def body():
+        started = asyncio.Event()
+
+        async def loader(key):
+            started.set()
+            await asyncio.sleep(0.01)
+            return "stale"
+
+        task = asyncio.ensure_future(ttl_cache.get_or_load(1, loader))
+        await started.wait()
+        ttl_cache.invalidate(1)
+        return await task
+
+    assert asyncio.run(body()) == "stale"  # de caller krijgt zijn waarde nog
+    assert ttl_cache.get(1) is None  # maar de cache bewaart ze niet
+
+def test_waiter_retries_when_first_caller_is_cancelled(ttl_cache):
+    calls = []
+
+    async def body():
+        async def loader(key):
+            calls.append(key)
+            await asyncio.sleep(0.05 if len(calls) == 1 else 0)
+            return len(calls)
+
+        first = asyncio.ensure_future(ttl_cache.get_or_load(1, loader))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(ttl_cache.get_or_load(1, loader))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(body()) == 2
+    assert calls == [1, 1]
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from fastapi import Response
+from starlette.requests import Request
+
+from app.conditional import conditional_response, has_conditions, is_not_modified, last_modified, make_etag
+
+MODIFIED = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+
+
+def request(**headers):
+    return Request({"type": "http", "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]})
+
+def test_make_etag_is_weak_and_stable():
+    etag = make_etag(1, MODIFIED)
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == make_etag(1, MODIFIED)
+    assert etag != make_etag(1, MODIFIED + timedelta(microseconds=1))
+
+def test_last_modified():
+    naive = datetime(2024, 5, 2, 8, 0)
+    assert last_modified(MODIFIED, None, naive) == naive.replace(tzinfo=timezone.utc)
+    assert last_modified(None, None) is None
+
+def test_has_conditions():
+    assert not has_conditions(request())
+    assert has_conditions(request(if_none_match="*"))
+    assert has_conditions(request(if_modified_since="x"))
+
+@pytest.mark.parametrize("header, expected", [
+    ('"{tag}"', True),
+    ('W/"{tag}"', True),
+    ('"other", W/"{tag}"', True),
+    ("*", True),
+    ('"other"', False),
+])
+def test_if_none_match_uses_weak_comparison(header, expected):
+    etag = make_etag(1)
+    tag = etag.removeprefix('W/"').removesuffix('"')
+    assert is_not_modified(request(if_none_match=header.format(tag=tag)), etag, MODIFIED) is expected
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    since = format_datetime(MODIFIED + timedelta(days=1), usegmt=True)
+    assert not is_not_modified(request(if_none_match='"other"', if_modified_since=since), make_etag(1), MODIFIED)
+
+def test_if_modified_since_has_second_resolution():
+    etag = make_etag(1)
+    #de header verliest de microseconden, toch moet dezelfde seconde als ongewijzigd tellen
+    assert is_not_modified(request(if_modified_since=format_datetime(MODIFIED, usegmt=True)), etag, MODIFIED)
+    earlier = format_datetime(MODIFIED - timedelta(seconds=1), usegmt=True)
+    assert not is_not_modified(request(if_modified_since=earlier), etag, MODIFIED)
+    assert not is_not_modified(request(if_modified_since="not a date"), etag, MODIFIED)
+    assert not is_not_modified(request(if_modified_since=earlier), etag, None)
+
+def test_conditional_response():
+    etag = make_etag(1)
+    not_modified = conditional_response(request(if_none_match=etag), Response(), etag, MODIFIED)
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert not_modified.headers["last-modified"] == "Wed, 01 May 2024 12:30:15 GMT"
+    assert not_modified.headers["cache-control"] == "no-cache"
+
+    response = Response()
+    assert conditional_response(request(), response, etag, None) is None
+    assert response.headers["etag"] == etag
+    assert "last-modified" not in response.headers
@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+import base64
+
+import pytest
+
+from app.functions import encode_cursor, decode_cursor
+
+
+def test_cursor_round_trips_created_at_and_id():
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, 42)
+    assert decode_cursor(cursor) == (created_at, 42)
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(datetime(2026, 3, 1, tzinfo=timezone.utc), 10 ** 12)
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"no separator").decode(),
+    base64.urlsafe_b64encode(b"yesterday|1").decode(),
+    base64.urlsafe_b64encode(b"2026-03-01T00:00:00+00:00|x").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+from app.functions import encode_rank_cursor, decode_rank_cursor
+
+def test_rank_cursor_round_trips_float_exactly():
+    rank = 0.1 + 0.2  # repr() houdt alle cijfers, de keyset vergelijking blijft exact
+    assert decode_rank_cursor(encode_rank_cursor(rank, 7)) == (rank, 7)
+
+@pytest.mark.parametrize("cursor", ["%%%", base64.urlsafe_b64encode(b"high|7").decode(), base64.urlsafe_b64encode(b"0.5|").decode()])
+def test_invalid_rank_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_rank_cursor(cursor)
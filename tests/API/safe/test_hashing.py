@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from app import functions
+from app.config import settings
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    """Replace the Argon2 bulk hash with a cheap one in a thread pool, recording the chunk each job got."""
+
+    seen = []
+    def fake_hash(passwords):
+        seen.append(list(passwords))
+        return [f"hash:{password}" for password in passwords]
+
+    monkeypatch.setattr(settings, "HASH_EXECUTOR", "thread")
+    monkeypatch.setattr(functions, "_hash_passwords_sync", fake_hash)
+    functions.shutdown_hash_executor()
+    yield seen
+    functions.shutdown_hash_executor()
+
+@pytest.mark.parametrize("chunk_size, expected", [(2, [2, 2, 1]), (0, [1] * 5), (-3, [1] * 5), (10, [5])])
+def test_hash_passwords_chunks_and_keeps_order(chunks, chunk_size, expected):
+    passwords = [f"pw{i}" for i in range(5)]
+    hashes = asyncio.run(functions.hash_passwords(passwords, chunk_size))
+    assert hashes == [f"hash:{password}" for password in passwords]
+    assert sorted(map(len, chunks), reverse=True) == expected
+
+def test_hash_passwords_without_passwords(chunks):
+    assert asyncio.run(functions.hash_passwords([], 8)) == []
+    assert chunks == []
@@ -0,0 +1,77 @@
+import json
+import uuid
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from conftest import run_with_engine
+import app.models as models
+from app.main import find_login_user, login_lookup
+
+
+def login_statement(identifier: str, legacy_username: bool = False) -> str:
+    """The SQL the safe API sends for a login with `identifier`, with the value inlined."""
+
+    statement = select(models.User).where(login_lookup(identifier, legacy_username))
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+def plan_indexes(plan: dict) -> set[str]:
+    """Index names used anywhere in an EXPLAIN JSON plan."""
+
+    indexes = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        indexes |= plan_indexes(child)
+    return indexes
+
+def in_rolled_back_session(body):
+    """Run `body(session)` in a transaction that is always rolled back."""
+
+    async def main():
+        from app.database import AsyncSessionLocal
+        async with AsyncSessionLocal() as session:
+            try:
+                return await body(session)
+            finally:
+                await session.rollback()
+
+    return run_with_engine(main)
+
+def test_lookup_picks_one_column():
+    assert "lower(access.users.username) = 'alice'" in login_statement("  Alice ")
+    assert "lower(access.users.email) = 'alice@example.com'" in login_statement("Alice@Example.com")
+    assert "lower(access.users.username) = 'old@name'" in login_statement("Old@Name", legacy_username=True)
+
+@pytest.mark.parametrize("identifier, index", [
+    ("USERNAME", "ix_users_username_lower"),
+    ("email@example.COM", "ix_users_email_lower"),
+    ("LEGACY@name", "ix_users_username_lower"),
+])
+def test_lookup_uses_lower_index(database, identifier, index):
+    async def body(session):
+        #de tabel kan klein zijn, dan verkiest de planner terecht een seq scan; hier telt enkel dat de index bruikbaar is
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+        sql = login_statement(identifier, legacy_username=identifier.startswith("LEGACY"))
+        return (await session.execute(text("EXPLAIN (FORMAT JSON) " + sql))).scalar()
+
+    plan = in_rolled_back_session(body)
+    plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+    assert plan_indexes(plan) == {index}
+
+def test_find_login_user_falls_back_to_legacy_usernames(database):
+    suffix = uuid.uuid4().hex[:8]
+
+    async def body(session):
+        #bestaat van voor migratie 004, nieuwe usernames met '@' worden geweigerd
+        legacy = models.User(username=f"Legacy@{suffix}", email=f"legacy{suffix}@example.com", password_hash="x")
+        regular = models.User(username=f"regular{suffix}", email=f"Regular{suffix}@Example.com", password_hash="x")
+        session.add_all([legacy, regular])
+        await session.flush()
+        found = {
+            identifier: getattr(await find_login_user(session, identifier), "id", None)
+            for identifier in (f" legacy@{suffix.upper()} ", f"legacy{suffix}@example.com", f"REGULAR{suffix}", f"regular{suffix}@example.com", f"nobody@{suffix}")
+        }
+        return found, legacy.id, regular.id
+
+    found, legacy_id, regular_id = in_rolled_back_session(body)
+    assert list(found.values()) == [legacy_id, legacy_id, regular_id, regular_id, None]
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from app import mail
+from app.config import settings
+
+
+@pytest.mark.skipif("MAIL_BACKEND" in os.environ, reason="MAIL_BACKEND is set in the environment")
+def test_smtp_is_the_default_backend():
+    assert settings.MAIL_BACKEND == "smtp"
+    assert isinstance(mail.get_sender(), mail.SmtpSender)
+
+def test_file_backend_requires_dev_mode(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "MAIL_BACKEND", "file")
+    monkeypatch.setattr(settings, "MAIL_FILE_PATH", str(tmp_path / "outbox.jsonl"))
+    monkeypatch.setattr(settings, "MAIL_DEV_MODE", False)
+    with pytest.raises(ValueError, match="MAIL_DEV_MODE"):
+        mail.get_sender()
+    monkeypatch.setattr(settings, "MAIL_DEV_MODE", True)
+    assert isinstance(mail.get_sender(), mail.FileSender)
+
+def test_unknown_backend(monkeypatch):
+    monkeypatch.setattr(settings, "MAIL_BACKEND", "carrier-pigeon")
+    with pytest.raises(ValueError, match="MAIL_BACKEND must be one of"):
+        mail.get_sender()
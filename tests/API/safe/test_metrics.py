@@ -0,0 +1,61 @@
+import pytest
+
+import app.metrics as metrics
+from app.metrics import Counter, Histogram, GaugeFunc, render_metrics
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Fresh registry per test, the app's own metrics stay out of the output."""
+
+    monkeypatch.setattr(metrics, "_registry", [])
+
+def test_counter_renders_help_type_and_labelled_values():
+    counter = Counter("logins_total", "Login attempts.", ("outcome",))
+    counter.inc("ok")
+    counter.inc("ok")
+    counter.inc("failed", amount=3)
+    assert counter.render() == [
+        "# HELP logins_total Login attempts.",
+        "# TYPE logins_total counter",
+        'logins_total{outcome="ok"} 2',
+        'logins_total{outcome="failed"} 3',
+    ]
+
+def test_label_values_are_escaped():
+    counter = Counter("requests_total", "Requests.", ("route",))
+    counter.inc('/a"b\\c\nd')
+    assert counter.render()[-1] == 'requests_total{route="/a\\"b\\\\c\\nd"} 1'
+
+def test_histogram_buckets_are_cumulative_and_upper_bound_inclusive():
+    histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 5.65",
+        "latency_seconds_count 4",
+    ]
+
+def test_histogram_keeps_series_per_label_set():
+    histogram = Histogram("query_seconds", "Query time.", ("op",), buckets=(1.0,))
+    histogram.observe(0.5, "select")
+    histogram.observe(2.0, "insert")
+    lines = histogram.render()
+    assert 'query_seconds_bucket{op="select",le="1.0"} 1' in lines
+    assert 'query_seconds_bucket{op="insert",le="1.0"} 0' in lines
+    assert 'query_seconds_count{op="insert"} 1' in lines
+
+def test_gauge_func_reads_value_at_render_time():
+    value = {"current": 1}
+    GaugeFunc("pool_checked_out", "Checked out.", lambda: value["current"])
+    value["current"] = 4
+    assert render_metrics().splitlines()[-1] == "pool_checked_out 4"
+
+def test_gauge_func_is_left_out_when_callback_fails_or_returns_none():
+    GaugeFunc("broken", "Fails.", lambda: 1 / 0)
+    GaugeFunc("not_applicable", "No pool.", lambda: None)
+    GaugeFunc("total", "Running total.", lambda: 7, "counter")
+    assert render_metrics() == "# HELP total Running total.\n# TYPE total counter\ntotal 7\n"
@@ -0,0 +1,99 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from conftest import fake_time, run_with_engine
+import app.ratelimit as ratelimit
+from app.ratelimit import RateLimit, MemoryRateLimitStore, PostgresRateLimitStore
+
+
+def test_rate_limit_parses_count_and_unit():
+    limit = RateLimit("10/minute")
+    assert (limit.limit, limit.period, limit.interval) == (10, 60, 6)
+    assert RateLimit(" 3 / Hours ").period == 3600
+
+@pytest.mark.parametrize("value", ["0/minute", "-1/minute", "10/week", "10", "ten/minute", ""])
+def test_rate_limit_rejects_invalid_values_with_setting_name(value):
+    with pytest.raises(ValueError, match="RATE_LIMIT_LOGIN_USER"):
+        RateLimit(value, "RATE_LIMIT_LOGIN_USER")
+
+
+@pytest.fixture
+def memory_store(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "time", fake_time(clock))
+    return MemoryRateLimitStore(shards=4, sweep_every=1000)
+
+def hits(store, key, limit, count):
+    return [asyncio.run(store.hit(key, limit)) for _ in range(count)]
+
+def test_memory_store_allows_a_burst_of_limit_hits(memory_store):
+    limit = RateLimit("5/minute")
+    assert hits(memory_store, "ip:a", limit, 5) == [0] * 5
+    assert hits(memory_store, "ip:a", limit, 1)[0] > 0
+
+def test_memory_store_retry_after_is_time_until_next_slot(memory_store, clock):
+    limit = RateLimit("5/minute")  # één slot per 12 seconden
+    hits(memory_store, "ip:a", limit, 5)
+    assert asyncio.run(memory_store.hit("ip:a", limit)) == pytest.approx(12)
+
+    clock.advance(5)
+    assert asyncio.run(memory_store.hit("ip:a", limit)) == pytest.approx(7)
+
+    clock.advance(7)
+    assert asyncio.run(memory_store.hit("ip:a", limit)) == 0
+    assert asyncio.run(memory_store.hit("ip:a", limit)) == pytest.approx(12)
+
+def test_memory_store_rejected_hits_do_not_consume_capacity(memory_store, clock):
+    limit = RateLimit("2/second")
+    hits(memory_store, "ip:a", limit, 2)
+    hits(memory_store, "ip:a", limit, 10)  # allemaal geweigerd
+    clock.advance(0.5)
+    assert asyncio.run(memory_store.hit("ip:a", limit)) == 0
+
+def test_memory_store_keys_are_independent(memory_store):
+    limit = RateLimit("1/minute")
+    assert hits(memory_store, "ip:a", limit, 1) == [0]
+    assert hits(memory_store, "ip:b", limit, 1) == [0]
+    assert hits(memory_store, "ip:a", limit, 1)[0] > 0
+
+def test_memory_store_sweep_drops_idle_keys_one_shard_at_a_time(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "time", fake_time(clock))
+    store = MemoryRateLimitStore(shards=2, sweep_every=1)
+    limit = RateLimit("1/second")
+    keys = [f"ip:{i}" for i in range(20)]
+    for key in keys:
+        asyncio.run(store.hit(key, limit))
+    assert sum(len(shard) for shard in store._shards) == len(keys)
+
+    clock.advance(2)  # alle keys idle
+    asyncio.run(store.hit("ip:new", limit))  # sweept één shard
+    asyncio.run(store.hit("ip:new2", limit))  # en de volgende
+    remaining = {key for shard in store._shards for key in shard}
+    assert remaining <= {"ip:new", "ip:new2"}
+
+
+def test_postgres_store_applies_gcra_atomically(database):
+    key = f"test:{uuid.uuid4()}"
+    limit = RateLimit("3/hour")
+    store = PostgresRateLimitStore()
+
+    async def body():
+        from app.database import AsyncSessionLocal
+        try:
+            results = [await store.hit(key, limit) for _ in range(4)]
+            async with AsyncSessionLocal() as session:
+                remaining = (await session.execute(
+                    text("SELECT EXTRACT(EPOCH FROM tat - now())::float FROM access.rate_limits WHERE key = :key"), {"key": key})).scalar()
+            return results, remaining
+        finally:
+            async with AsyncSessionLocal() as session:
+                await session.execute(text("DELETE FROM access.rate_limits WHERE key = :key"), {"key": key})
+                await session.commit()
+
+    results, remaining = run_with_engine(body)
+    assert results[:3] == [0, 0, 0]
+    assert results[3] == pytest.approx(limit.interval)
+    #drie hits van elk 20 minuten, de geweigerde vierde schuift de tat niet op
+    assert remaining == pytest.approx(3 * limit.interval, abs=5)
@@ -0,0 +1,33 @@
+from app.render import SANITIZER_POLICY_VERSION, content_hash, plain_text, render_content, rendered_fields
+
+
+def test_script_and_event_handlers_are_removed():
+    rendered = render_content('<p onclick="x()">hi</p><script>alert(1)</script><style>p{}</style>')
+    assert rendered == "<p>hi</p>"
+
+def test_javascript_links_are_dropped_and_rel_is_forced():
+    rendered = render_content('<a href="javascript:alert(1)">a</a><a href="https://example.com">b</a>')
+    assert "javascript" not in rendered
+    assert 'href="https://example.com"' in rendered
+    assert 'rel="noopener noreferrer nofollow"' in rendered
+
+def test_non_html_content_is_escaped():
+    assert render_content("<b>x</b> & y", "text/plain") == "&lt;b&gt;x&lt;/b&gt; &amp; y"
+
+def test_missing_mime_is_treated_as_html():
+    assert render_content("<b>x</b>", None) == "<b>x</b>"
+
+def test_plain_text_separates_blocks_and_unescapes():
+    assert plain_text("<p>one</p><p>two &amp; <b>three</b></p><ul><li>a</li><li>b</li></ul>") == "one two & three a b"
+
+def test_rendered_fields():
+    source = "<p>hi</p><script>x</script>"
+    fields = rendered_fields(source)
+    assert fields == {
+        "content_rendered": "<p>hi</p>",
+        "content_text": "hi",
+        "content_hash": content_hash(source),
+        "render_version": SANITIZER_POLICY_VERSION,
+    }
+    #de hash gaat over de bron, niet over de gerenderde HTML
+    assert content_hash(source) != content_hash("<p>hi</p>")
@@ -0,0 +1,9 @@
+from app.main import safe_snippet
+
+
+def test_snippet_keeps_only_mark_highlights():
+    snippet = '<mark>alert</mark>(1) <img src=x onerror="steal()"> & more'
+    assert safe_snippet(snippet) == '<mark>alert</mark>(1) &lt;img src=x onerror=&quot;steal()&quot;&gt; &amp; more'
+
+def test_snippet_none_stays_none():
+    assert safe_snippet(None) is None